@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+pg_fdw_schema_drift.py — detecção incremental de drift entre tabelas estrangeiras (postgres_fdw) e a origem,
+com reimportação só das tabelas que mudaram
+
+O pg_fdw-diferencas_estrangeiras.sql puxa o information_schema.columns remoto inteiro via dblink e faz
+FULL OUTER JOIN coluna a coluna a cada execução; a correção (apagar e importar de novo) fica manual.
+Aqui:
+  ✓ cada lado calcula no próprio servidor uma impressão digital por tabela:
+    md5 de coluna:tipo:not_null, em ordem de nome de coluna (pg_attribute + format_type, o mesmo
+    tipo que o IMPORT FOREIGN SCHEMA grava na tabela estrangeira)
+  ✓ primeiro só o hash agregado (uma linha por lado) é comparado; se bater, o par está em dia.
+    O cache (--cache, JSON) guarda o mapa tabela -> impressão digital de cada lado junto com o
+    hash agregado, então em regime só o lado que mudou é lido tabela a tabela
+  ✓ as tabelas com drift são corrigidas em paralelo (--jobs), cada uma numa transação própria com
+    lock_timeout: DROP FOREIGN TABLE + IMPORT FOREIGN SCHEMA ... LIMIT TO (tabela); se o lock não vier,
+    tenta de novo depois, sem segurar as outras
+  ✓ vários pares local/remoto (--config) são verificados ao mesmo tempo
+  ✓ os mesmos filtros de nome do script SQL (pg%, google%, hypopg%, terminadas em número, blocking_procs)
+
+Dependências:
+  pip install asyncpg
+
+Exemplo de uso:
+  # só listar (sem alterar nada)
+  python3 pg_fdw_schema_drift.py --local-dsn postgresql://postgres@10.0.0.2/app_b \
+    --remote-dsn postgresql://postgres@10.0.0.1/app_a --server servidor_fdw --local-schema remoto --dry-run
+
+  # corrigir, com cache para as próximas execuções
+  python3 pg_fdw_schema_drift.py --local-dsn ... --remote-dsn ... --server servidor_fdw --local-schema remoto \
+    --cache drift_cache.json --jobs 8 --lock-timeout 2
+
+  # vários pares (lista JSON de objetos com local_dsn, remote_dsn, server, local_schema e remote_schema)
+  python3 pg_fdw_schema_drift.py --config fleet.json --cache drift_cache.json
+"""
+
+import argparse
+import asyncio
+import asyncpg
+import json
+import os
+import sys
+import time
+from urllib.parse import urlsplit
+
+# filtros do pg_fdw-diferencas_estrangeiras.sql
+EXCLUDE_LIKE = ['pg%', 'google%', 'hypopg%']
+EXCLUDE_REGEX = r'\d+$'
+EXCLUDE_NAMES = ['blocking_procs']
+
+FINGERPRINT_SQL = """
+SELECT c.relname AS table_name,
+       md5(string_agg(a.attname || ':' || format_type(a.atttypid, a.atttypmod) || ':' || a.attnotnull::text,
+                      ',' ORDER BY a.attname)) AS fp
+  FROM pg_class c
+  JOIN pg_namespace n ON n.oid = c.relnamespace
+  JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+ WHERE n.nspname = $1
+   AND {relfilter}
+   AND NOT (c.relname LIKE ANY($2::text[]))
+   AND ($3::text IS NULL OR c.relname !~ $3)
+   AND NOT (c.relname = ANY($4::text[]))
+ GROUP BY c.relname
+"""
+
+# o que o IMPORT FOREIGN SCHEMA importa (partições ficam de fora, como no padrão do postgres_fdw)
+# $5 (servidor) só é usado no lado local; no remoto entra como NULL só para manter os mesmos parâmetros
+REMOTE_FILTER = "c.relkind IN ('r', 'v', 'm', 'f', 'p') AND NOT c.relispartition AND $5::text IS NULL"
+LOCAL_FILTER = """c.relkind = 'f' AND EXISTS (
+        SELECT 1 FROM pg_foreign_table ft JOIN pg_foreign_server s ON s.oid = ft.ftserver
+         WHERE ft.ftrelid = c.oid AND s.srvname = $5)"""
+
+AGGREGATE_SQL = """
+SELECT md5(coalesce(string_agg(table_name || '=' || fp, ',' ORDER BY table_name), '')) AS agg, count(*) AS tables
+  FROM ({fingerprints}) t
+"""
+
+
+def quote_ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def dsn_label(dsn):
+    """host:port/dbname (nunca inclui a senha)."""
+    parts = urlsplit(dsn)
+    return f"{parts.hostname or 'localhost'}:{parts.port or 5432}/{parts.path.lstrip('/') or parts.username or ''}"
+
+
+class Side:
+    """Um lado do par (remoto: tabelas de origem; local: tabelas estrangeiras do servidor FDW)."""
+
+    def __init__(self, name, schema, relfilter, server, excludes):
+        self.name = name
+        self.schema = schema
+        self.server = server
+        self.excludes = excludes
+        fingerprints = FINGERPRINT_SQL.format(relfilter=relfilter)
+        self.fp_sql = fingerprints
+        self.agg_sql = AGGREGATE_SQL.format(fingerprints=fingerprints)
+
+    def params(self):
+        like, regex, names = self.excludes
+        return (self.schema, like, regex, names, self.server)
+
+    async def aggregate(self, conn):
+        row = await conn.fetchrow(self.agg_sql, *self.params())
+        return row['agg'], row['tables']
+
+    async def fingerprints(self, conn):
+        return {r['table_name']: r['fp'] for r in await conn.fetch(self.fp_sql, *self.params())}
+
+
+def diff(remote, local):
+    """{tabela: 'missing_local' | 'missing_remote' | 'mismatch'}."""
+    out = {}
+    for t, fp in remote.items():
+        if t not in local:
+            out[t] = 'missing_local'
+        elif local[t] != fp:
+            out[t] = 'mismatch'
+    for t in local:
+        if t not in remote:
+            out[t] = 'missing_remote'
+    return out
+
+
+class DriftPair:
+    """Um banco local com tabelas estrangeiras apontando para um banco remoto via `server`."""
+
+    def __init__(self, cfg, args):
+        self.local_dsn = cfg['local_dsn']
+        self.remote_dsn = cfg['remote_dsn']
+        self.server = cfg['server']
+        self.local_schema = cfg['local_schema']
+        self.remote_schema = cfg.get('remote_schema', 'public')
+        self.args = args
+        self.key = f"{dsn_label(self.local_dsn)}:{self.local_schema} <- {self.server}:{self.remote_schema}"
+        excludes = (args.exclude_like, args.exclude_regex or None, args.exclude)
+        self.remote = Side('remote', self.remote_schema, REMOTE_FILTER, None, excludes)
+        self.local = Side('local', self.local_schema, LOCAL_FILTER, self.server, excludes)
+
+    async def _side_map(self, conn, side, cached, agg=None):
+        """({'agg', 'tables'}, leu tabela a tabela?) usando o cache quando o agregado (`agg`, ou lido aqui) não mudou."""
+        if agg is None:
+            agg, _ = await side.aggregate(conn)
+        if cached and cached.get('agg') == agg and cached.get('tables') is not None:
+            return cached, False
+        return {'agg': agg, 'tables': await side.fingerprints(conn)}, True
+
+    async def reimport(self, pool, table, kind):
+        """DROP + IMPORT ... LIMIT TO de uma tabela, numa transação com lock_timeout (com novas tentativas)."""
+        args = self.args
+        target = f"{quote_ident(self.local_schema)}.{quote_ident(table)}"
+        for attempt in range(1, args.retries + 2):
+            try:
+                async with pool.acquire() as conn:
+                    async with conn.transaction():
+                        await conn.execute(f"SET LOCAL lock_timeout = '{int(args.lock_timeout * 1000)}ms'")
+                        if kind != 'missing_local':
+                            await conn.execute(f"DROP FOREIGN TABLE IF EXISTS {target}")
+                        if kind != 'missing_remote':
+                            await conn.execute(
+                                f"IMPORT FOREIGN SCHEMA {quote_ident(self.remote_schema)} LIMIT TO ({quote_ident(table)}) "
+                                f"FROM SERVER {quote_ident(self.server)} INTO {quote_ident(self.local_schema)}")
+                return True
+            except asyncpg.LockNotAvailableError:
+                if attempt > args.retries:
+                    print(f"  ! {self.key} {table}: lock not granted after {attempt} attempts", file=sys.stderr)
+                    return False
+                await asyncio.sleep(min(args.lock_timeout * attempt, 30))
+            except (asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                print(f"  ! {self.key} {table}: {e}", file=sys.stderr)
+                return False
+
+    async def check(self, cache):
+        t0 = time.perf_counter()
+        entry = cache.get(self.key, {})
+        remote_conn = local_conn = None
+        try:
+            # as duas conexões dentro do try: se a local falhar, a remota não fica aberta
+            remote_conn = await asyncpg.connect(self.remote_dsn, timeout=self.args.timeout)
+            local_conn = await asyncpg.connect(self.local_dsn, timeout=self.args.timeout)
+            remote_agg, _ = await self.remote.aggregate(remote_conn)
+            local_agg, _ = await self.local.aggregate(local_conn)
+            if remote_agg == local_agg:
+                # em dia: os mapas dos dois lados são iguais; lê um deles só se o cache ainda não o tiver
+                if entry.get('remote', {}).get('agg') != remote_agg or entry.get('local', {}).get('agg') != remote_agg:
+                    tables = await self.remote.fingerprints(remote_conn)
+                    side = {'agg': remote_agg, 'tables': tables}
+                    cache[self.key] = {'remote': side, 'local': side}
+                return {'pair': self.key, 'status': 'in_sync', 'drift': {}, 'seconds': time.perf_counter() - t0}
+            remote_map, remote_read = await self._side_map(remote_conn, self.remote, entry.get('remote'), remote_agg)
+            local_map, local_read = await self._side_map(local_conn, self.local, entry.get('local'), local_agg)
+        finally:
+            for conn in (remote_conn, local_conn):
+                if conn is not None:
+                    await conn.close()
+
+        drift = diff(remote_map['tables'], local_map['tables'])
+        fixable = {t: k for t, k in drift.items() if k != 'missing_remote' or self.args.drop_missing}
+        fixed, failed = [], []
+        if fixable and not self.args.dry_run:
+            pool = await asyncpg.create_pool(self.local_dsn, min_size=1, max_size=self.args.jobs, timeout=self.args.timeout)
+            try:
+                todo = sorted(fixable.items())
+                oks = await asyncio.gather(*(self.reimport(pool, t, k) for t, k in todo))
+                async with pool.acquire() as conn:
+                    local_map, _ = await self._side_map(conn, self.local, None)
+            finally:
+                await pool.close()
+            for (t, _), ok in zip(todo, oks):
+                (fixed if ok else failed).append(t)
+
+        cache[self.key] = {'remote': remote_map, 'local': local_map}
+        return {
+            'pair': self.key,
+            'status': 'drift' if drift else 'in_sync',
+            'drift': drift,
+            'fixed': fixed,
+            'failed': failed,
+            'read_per_table': {'remote': remote_read, 'local': local_read},
+            'seconds': time.perf_counter() - t0,
+        }
+
+
+def load_cache(path):
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(path, cache):
+    if not path:
+        return
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp, path)
+
+
+def pairs_from_args(args):
+    if args.config:
+        with open(args.config) as f:
+            return json.load(f)
+    missing = [o for o in ('local_dsn', 'remote_dsn', 'server', 'local_schema') if not getattr(args, o)]
+    if missing:
+        raise SystemExit('informe --config ou ' + ', '.join('--' + m.replace('_', '-') for m in missing))
+    return [{'local_dsn': args.local_dsn, 'remote_dsn': args.remote_dsn, 'server': args.server,
+             'local_schema': args.local_schema, 'remote_schema': args.remote_schema}]
+
+
+async def run(args):
+    t0 = time.perf_counter()
+    cache = load_cache(args.cache)
+    pairs = [DriftPair(cfg, args) for cfg in pairs_from_args(args)]
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one(pair):
+        async with sem:
+            try:
+                return await pair.check(cache)
+            # InterfaceError: conexão que caiu no meio da verificação; vira erro do par, não derruba os outros
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError, asyncio.TimeoutError) as e:
+                return {'pair': pair.key, 'status': 'error', 'error': str(e), 'drift': {}}
+
+    results = await asyncio.gather(*(one(p) for p in pairs))
+    save_cache(args.cache, cache)
+
+    if args.format == 'json':
+        json.dump(results, sys.stdout, indent=2, default=str)
+        print()
+    else:
+        for r in results:
+            extra = f" ({r['seconds']:.2f}s)" if 'seconds' in r else ''
+            print(f"{r['pair']}: {r['status']}{extra}" + (f" - {r['error']}" if r.get('error') else ''))
+            for t, kind in sorted(r['drift'].items()):
+                mark = ' fixed' if t in r.get('fixed', ()) else (' FAILED' if t in r.get('failed', ()) else '')
+                print(f"    {kind:<22} {t}{mark}")
+        print(f"{len(pairs)} pair(s) checked in {time.perf_counter() - t0:.2f}s")
+
+    bad = any(r['status'] == 'error' or r.get('failed') for r in results)
+    pending = any(r['drift'] for r in results) and args.dry_run
+    return 1 if bad else (2 if pending else 0)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description='Incremental FDW schema drift detection and targeted re-import')
+    p.add_argument('--config', help='JSON list of pairs: local_dsn, remote_dsn, server, local_schema, remote_schema')
+    p.add_argument('--local-dsn', help='database that holds the foreign tables')
+    p.add_argument('--remote-dsn', help='database the FDW server points to')
+    p.add_argument('--server', help='foreign server name (CREATE SERVER ...)')
+    p.add_argument('--local-schema', help='local schema of the foreign tables')
+    p.add_argument('--remote-schema', default='public')
+    p.add_argument('--cache', help='JSON file with the per-table fingerprints of the last run')
+    p.add_argument('--dry-run', action='store_true', help='only report (exit code 2 when there is drift; 1 on errors or failed re-imports)')
+    p.add_argument('--drop-missing', action='store_true', help='drop foreign tables whose remote table no longer exists')
+    p.add_argument('--jobs', type=int, default=4, help='concurrent re-imports per pair')
+    p.add_argument('--concurrency', type=int, default=8, help='pairs checked at the same time')
+    p.add_argument('--lock-timeout', type=float, default=2.0, help='lock_timeout (s) for each DROP/IMPORT')
+    p.add_argument('--retries', type=int, default=3, help='retries per table after a lock timeout')
+    p.add_argument('--timeout', type=float, default=30.0, help='connect timeout (s)')
+    p.add_argument('--exclude-like', nargs='*', default=EXCLUDE_LIKE, help='LIKE patterns of table names to ignore')
+    p.add_argument('--exclude-regex', default=EXCLUDE_REGEX, help='regex of table names to ignore ("" disables)')
+    p.add_argument('--exclude', nargs='*', default=EXCLUDE_NAMES, help='table names to ignore')
+    p.add_argument('--format', choices=('table', 'json'), default='table')
+    return p.parse_args()
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run(parse_args())))
@@ -0,0 +1,664 @@
+#!/usr/bin/env python3
+"""
+pg_partition_copy.py — cópia paralela, em blocos e retomável para o fluxo do partition_existing_table
+
+O copy_data_to_new_table (pg_copy_data_to_new_table.sql) faz um único
+INSERT INTO <tabela>_new SELECT * FROM <tabela>: uma transação de horas, rajadas de WAL,
+nenhuma visibilidade de progresso e, se falhar, tudo recomeça do zero.
+
+Este driver faz a mesma cópia em blocos:
+  ✓ divide a tabela por mês da coluna de particionamento (--split partition, um bloco por partição
+    <tabela>_yYYYYmMM) ou por faixa da PK numérica (--split pk --chunk-rows N)
+  ✓ cada bloco é um COPY binário da origem (COPY (SELECT ...) TO STDOUT) direto para o COPY FROM STDIN
+    da tabela nova, sem passar por disco, em --jobs conexões simultâneas
+  ✓ o checkpoint do bloco (tabela partition_copy_progress) é gravado na mesma transação do COPY:
+    ou o bloco está inteiro na tabela nova e marcado, ou não está em lugar nenhum; rodar de novo
+    continua de onde parou
+  ✓ a divisão em blocos (faixa de meses ou de PK e o tamanho do bloco) é gravada na primeira execução
+    (partition_copy_progress_plan) e reaproveitada nas seguintes: uma retomada copia os mesmos
+    blocos, nunca uma faixa nova que o min/max atual criaria (no modo --online essas linhas já
+    entram pelo log). Para replanejar, --reset
+  ✓ progresso com linhas/s, MB/s e ETA a cada --progress-interval segundos
+  ✓ --setup chama create_partitioned_table + generate_and_execute_partition_scripts antes e
+    --swap faz as mesmas renomeações do partition_existing_table quando todos os blocos terminam
+
+A origem não é bloqueada: sem --online, escritas feitas nela durante a cópia não entram na tabela
+nova. Rode numa janela de manutenção (ou com a aplicação parada) antes do --swap.
+
+Modo --online (mesmo padrão de trigger do trigger_de_dml.sql, mas guardando só a PK):
+  1. antes da cópia, um trigger AFTER INSERT/UPDATE/DELETE grava a PK de cada linha alterada
+     em <tabela>_changes
+  2. a cópia em blocos roda normalmente, com a aplicação escrevendo na origem
+  3. catch-up: em lotes de --replay-batch chaves, apaga as chaves na tabela nova e insere de novo a
+     versão atual da origem (e apaga as entradas aplicadas do log na mesma transação), até sobrarem
+     no máximo --max-lag-rows alterações pendentes; a cada passada mostra o lag (linhas e idade)
+  4. com --swap, o cutover: LOCK TABLE <tabela> IN EXCLUSIVE MODE (leituras continuam, escritas
+     esperam), aplica o restante do log, sobe para ACCESS EXCLUSIVE (o que o rename precisa),
+     renomeia, remove o trigger e faz COMMIT; o tempo com o lock é medido e mostrado. O
+     --lock-timeout vale para todos os locks da transação: se algum não vier, tudo é desfeito,
+     faz mais uma passada de catch-up e tenta de novo (--cutover-retries)
+  TRUNCATE na origem durante o modo online não é capturado.
+
+Dependências:
+  pip install asyncpg
+  (para --setup, as funções de pg_create_partitioned_table.sql e
+   pg_generate_and_execute_partition_scripts.sql instaladas no banco)
+
+Exemplo de uso:
+  # cria a tabela nova + partições e copia um mês por bloco, 8 em paralelo
+  python3 pg_partition_copy.py --host 127.0.0.1 --dbname app --user postgres --password 1234 \
+    tabela_teste --partition-column coluna_de_data --from 2021-06-01 --to 2024-12-31 --setup --jobs 8
+
+  # mesma cópia retomada depois de uma falha, trocando as tabelas no final
+  python3 pg_partition_copy.py --host 127.0.0.1 --dbname app --user postgres --password 1234 \
+    tabela_teste --partition-column coluna_de_data --from 2021-06-01 --to 2024-12-31 --jobs 8 --swap
+
+  # online: captura alterações durante a cópia, alcança a origem e troca as tabelas com lock curto
+  python3 pg_partition_copy.py --host 127.0.0.1 --dbname app --user postgres --password 1234 \
+    tabela_teste --partition-column coluna_de_data --from 2021-06-01 --to 2024-12-31 --setup --online --swap
+
+  # blocos de 5 milhões de linhas por faixa da PK
+  python3 pg_partition_copy.py ... tabela_teste --partition-column coluna_de_data --split pk --chunk-rows 5000000
+"""
+
+import argparse
+import asyncio
+import asyncpg
+import sys
+import time
+from datetime import date
+
+PROGRESS_TABLE = 'partition_copy_progress'
+
+PROGRESS_DDL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    job         text        NOT NULL,
+    lo          text        NOT NULL,
+    hi          text        NOT NULL,
+    rows_copied bigint      NOT NULL,
+    bytes       bigint      NOT NULL,
+    seconds     numeric     NOT NULL,
+    done_at     timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (job, lo, hi)
+)
+"""
+
+PLAN_DDL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    job        text        PRIMARY KEY,
+    split      text        NOT NULL,
+    lo         text,
+    hi         text,
+    step       bigint,
+    created_at timestamptz NOT NULL DEFAULT now()
+)
+"""
+
+# tamanho da fila entre o COPY de saída e o de entrada (em pedaços do protocolo, ~64 KB cada)
+COPY_QUEUE_SIZE = 64
+
+_EOF = object()
+_ABORT = object()
+
+
+class Chunk:
+    __slots__ = ('lo', 'hi', 'label')
+
+    def __init__(self, lo, hi, label):
+        self.lo = lo
+        self.hi = hi
+        self.label = label
+
+
+def add_month(d):
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def month_chunks(base, from_date, to_date):
+    """Um bloco por mês, com o mesmo nome das partições do generate_and_execute_partition_scripts."""
+    chunks = []
+    d = date(from_date.year, from_date.month, 1)
+    while d <= to_date:
+        nxt = add_month(d)
+        chunks.append(Chunk(d.isoformat(), nxt.isoformat(), f"{base}_y{d.year:04d}m{d.month:02d}"))
+        d = nxt
+    return chunks
+
+
+def pk_chunks(lo, hi, step):
+    chunks = []
+    start = lo
+    while start <= hi:
+        end = start + step
+        chunks.append(Chunk(str(start), str(end), f"pk [{start}, {end})"))
+        start = end
+    return chunks
+
+
+class Progress:
+    """Contadores da cópia; report() imprime vazão do intervalo, média e ETA."""
+
+    def __init__(self, total_chunks, done_chunks, estimated_rows):
+        self.total_chunks = total_chunks
+        self.done_chunks = done_chunks
+        self.estimated_rows = estimated_rows
+        self.rows = 0
+        self.bytes = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+        self._last = (self.started, 0, 0)
+
+    def report(self):
+        now = time.perf_counter()
+        t0, rows0, bytes0 = self._last
+        self._last = (now, self.rows, self.bytes)
+        dt = max(now - t0, 1e-6)
+        elapsed = max(now - self.started, 1e-6)
+        avg = self.rows / elapsed
+        eta = ''
+        if self.estimated_rows and avg > 0:
+            remaining = max(self.estimated_rows - self.rows, 0)
+            eta = f" eta={remaining / avg / 60:.1f}min"
+        print(f"[{time.strftime('%H:%M:%S')}] chunks={self.done_chunks}/{self.total_chunks} failed={self.failed} "
+              f"rows={self.rows} {(self.rows - rows0) / dt:,.0f} rows/s ({(self.bytes - bytes0) / dt / 1048576:.1f} MB/s) "
+              f"avg={avg:,.0f} rows/s{eta}", flush=True)
+
+
+async def table_columns(conn, table):
+    rows = await conn.fetch(
+        "SELECT attname FROM pg_attribute WHERE attrelid = $1::regclass AND attnum > 0 AND NOT attisdropped ORDER BY attnum",
+        table)
+    return [r['attname'] for r in rows]
+
+
+async def pk_column(conn, table):
+    rows = await conn.fetch("""
+        SELECT a.attname, format_type(a.atttypid, a.atttypmod) AS type
+          FROM pg_index i
+          JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+         WHERE i.indrelid = $1::regclass AND i.indisprimary""", table)
+    if len(rows) != 1 or rows[0]['type'] not in ('integer', 'bigint', 'smallint'):
+        raise SystemExit(f"--split pk precisa de uma PK de uma coluna inteira em {table} "
+                         f"(encontrado: {', '.join(r['attname'] + ' ' + r['type'] for r in rows) or 'nenhuma'})")
+    return rows[0]['attname']
+
+
+def quote_ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+async def copy_chunk(src_pool, dst_pool, args, job, query, columns, chunk, progress):
+    """Copia um bloco (COPY binário origem -> destino) e grava o checkpoint na mesma transação."""
+    q = asyncio.Queue(maxsize=COPY_QUEUE_SIZE)
+    copied_bytes = 0
+
+    async def sink(data):
+        nonlocal copied_bytes
+        copied_bytes += len(data)
+        progress.bytes += len(data)
+        await q.put(data)
+
+    async def source():
+        while True:
+            data = await q.get()
+            if data is _EOF:
+                return
+            if data is _ABORT:
+                raise RuntimeError('source COPY failed')
+            yield data
+
+    async def produce():
+        try:
+            async with src_pool.acquire() as src:
+                await src.copy_from_query(query, chunk.lo, chunk.hi, output=sink, format='binary')
+        except asyncio.CancelledError:
+            raise  # cancelado porque o destino falhou: ninguém mais lê a fila
+        except BaseException:
+            await q.put(_ABORT)
+            raise
+        await q.put(_EOF)
+
+    t0 = time.perf_counter()
+    async with dst_pool.acquire() as dst:
+        async with dst.transaction():
+            producer = asyncio.create_task(produce())
+            try:
+                status = await dst.copy_to_table(args.new_table, source=source(), columns=columns,
+                                                 schema_name=args.schema, format='binary')
+            except BaseException:
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+                # se foi a origem que falhou, o erro dela é o que interessa
+                if producer.done() and not producer.cancelled() and producer.exception() is not None:
+                    raise producer.exception()
+                raise
+            await producer
+            rows = int(status.split()[-1])
+            await dst.execute(
+                f"INSERT INTO {args.progress_table} (job, lo, hi, rows_copied, bytes, seconds) VALUES ($1, $2, $3, $4, $5, $6)",
+                job, chunk.lo, chunk.hi, rows, copied_bytes, time.perf_counter() - t0)
+    progress.rows += rows
+    return rows
+
+
+async def worker(pending, src_pool, dst_pool, args, job, query, columns, progress):
+    while True:
+        try:
+            chunk = pending.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        for attempt in range(1, args.retries + 2):
+            try:
+                rows = await copy_chunk(src_pool, dst_pool, args, job, query, columns, chunk, progress)
+                progress.done_chunks += 1
+                if args.verbose:
+                    print(f"  {chunk.label}: {rows} rows")
+                break
+            # InterfaceError cobre a conexão que caiu no meio do bloco; a próxima tentativa pega
+            # outra conexão dos pools (o asyncpg reconecta as que foram fechadas)
+            except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, RuntimeError, asyncio.TimeoutError) as e:
+                if attempt > args.retries:
+                    progress.failed += 1
+                    print(f"  ! {chunk.label}: {e}", file=sys.stderr)
+                    break
+                print(f"  {chunk.label}: attempt {attempt} failed ({e}), retrying", file=sys.stderr)
+                await asyncio.sleep(min(2 ** attempt, 30))
+
+
+async def setup_tables(conn, args):
+    """Mesmos passos iniciais do partition_existing_table."""
+    exists = await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", args.new_table)
+    if exists:
+        print(f"{args.new_table} já existe, --setup ignorado")
+        return
+    if not (args.from_date and args.to_date):
+        raise SystemExit('--setup precisa de --from e --to')
+    await conn.execute("SELECT create_partitioned_table($1, $2)", args.table, args.partition_column)
+    await conn.execute("SELECT generate_and_execute_partition_scripts($1, $2, $3, $4, 1)",
+                       args.new_table, args.partition_column, args.from_date, args.to_date)
+    print(f"{args.new_table} criada com partições de {args.from_date} a {args.to_date}")
+
+
+async def rename_tables(conn, args):
+    """Renomeações do partition_existing_table (dentro da transação de quem chama)."""
+    t, n = args.table, args.new_table
+    await conn.execute(f"ALTER TABLE {t} RENAME CONSTRAINT pk_{t} TO pk_{t}_old")
+    await conn.execute(f"ALTER TABLE {t} RENAME TO {t}_old")
+    await conn.execute(f"ALTER TABLE {n} RENAME CONSTRAINT pk_{n} TO pk_{t}")
+    await conn.execute(f"ALTER TABLE {n} RENAME TO {t}")
+
+
+async def chunk_plan(conn, args, job, lo, hi, step=None):
+    """(lo, hi, step) da primeira execução do job; na primeira, grava os valores recebidos.
+
+    lo/hi são o primeiro mês e o último (--split partition) ou o min/max da PK (--split pk); None se
+    a origem estava vazia (sem blocos: tudo que chegar depois só entra pelo log do --online).
+    """
+    plan_table = f"{args.progress_table}_plan"
+    await conn.execute(PLAN_DDL.format(table=plan_table))
+    row = await conn.fetchrow(f"SELECT split, lo, hi, step FROM {plan_table} WHERE job = $1", job)
+    if row is None:
+        await conn.execute(f"INSERT INTO {plan_table} (job, split, lo, hi, step) VALUES ($1, $2, $3, $4, $5)",
+                           job, args.split, None if lo is None else str(lo), None if hi is None else str(hi), step)
+        return lo, hi, step
+    if row['split'] != args.split:
+        raise SystemExit(f"{job} was planned with --split {row['split']}; use it again or --reset")
+    parse = int if args.split == 'pk' else date.fromisoformat
+    plan = tuple(None if v is None else parse(v) for v in (row['lo'], row['hi'])) + (row['step'],)
+    if (lo, hi, step) != plan:
+        print(f"resuming with the chunk plan of the first run ({plan[0]} .. {plan[1]}"
+              f"{f', {plan[2]} per chunk' if plan[2] else ''}); --reset to plan again")
+    return plan
+
+
+async def uncovered_rows(conn, args, outside, bounds, capture=None):
+    """Linhas da origem fora das faixas dos blocos (inclusive chave NULL): nunca seriam copiadas.
+
+    Com --online, as que estão fora das faixas mas foram escritas depois do trigger não contam: ou
+    já foram reaplicadas (estão na tabela nova) ou ainda estão no log.
+    """
+    sql = f"SELECT count(*) FROM {args.table} o WHERE ({outside})"
+    if capture is not None:
+        sql += (f" AND NOT EXISTS (SELECT 1 FROM {capture.new_table} n WHERE {capture.key_match('n', 'o')})"
+                f" AND NOT EXISTS (SELECT 1 FROM {capture.log} l WHERE {capture.key_match('l', 'o')})")
+    return await conn.fetchval(sql, *bounds)
+
+
+async def verify_counts(conn, args):
+    """Sem --online: a tabela nova precisa ter exatamente as linhas da origem antes do --swap."""
+    src, dst = await conn.fetchrow(f"SELECT (SELECT count(*) FROM {args.table}), (SELECT count(*) FROM {args.new_table})")
+    if src != dst:
+        print(f"row count mismatch: {args.table}={src} {args.new_table}={dst}; --swap aborted "
+              f"(rows outside the --from/--to months or with a NULL {args.partition_column} are not copied)",
+              file=sys.stderr)
+        return False
+    print(f"row counts match ({src})")
+    return True
+
+
+async def swap_tables(conn, args):
+    """Renomeações do partition_existing_table, numa transação com lock_timeout."""
+    async with conn.transaction():
+        await conn.execute(f"SET LOCAL lock_timeout = '{int(args.lock_timeout * 1000)}ms'")
+        await rename_tables(conn, args)
+    print(f"{args.table} -> {args.table}_old, {args.new_table} -> {args.table}")
+
+
+class ChangeCapture:
+    """Log de PKs alteradas na origem (trigger) e reaplicação na tabela nova (modo --online)."""
+
+    def __init__(self, args, pk, columns):
+        self.args = args
+        self.table = args.table
+        self.new_table = args.new_table
+        self.log = f"{args.table}_changes"
+        self.func = f"{args.table}_capture_changes"
+        self.pk = pk  # [(coluna, tipo)] da PK da origem
+        self.columns = columns
+
+    @staticmethod
+    async def primary_key(conn, table):
+        rows = await conn.fetch("""
+            SELECT a.attname, format_type(a.atttypid, a.atttypmod) AS type
+              FROM pg_index i
+              CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, pos)
+              JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+             WHERE i.indrelid = $1::regclass AND i.indisprimary
+             ORDER BY k.pos""", table)
+        if not rows:
+            raise SystemExit(f"--online precisa de uma chave primária em {table}")
+        return [(r['attname'], r['type']) for r in rows]
+
+    async def install(self, conn):
+        """Cria o log e o trigger (idempotente: numa retomada, mantém o que já foi capturado)."""
+        cols = ', '.join(quote_ident(c) for c, _ in self.pk)
+        old = ', '.join(f"OLD.{quote_ident(c)}" for c, _ in self.pk)
+        new = ', '.join(f"NEW.{quote_ident(c)}" for c, _ in self.pk)
+        await conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.log} (
+                change_id bigserial PRIMARY KEY,
+                change_op char(1) NOT NULL,
+                changed_at timestamptz NOT NULL DEFAULT clock_timestamp(),
+                {', '.join(f'{quote_ident(c)} {t}' for c, t in self.pk)}
+            )""")
+        await conn.execute(f"""
+            CREATE OR REPLACE FUNCTION {self.func}()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                IF (TG_OP = 'DELETE') THEN
+                    INSERT INTO {self.log} (change_op, {cols}) VALUES ('D', {old});
+                    RETURN OLD;
+                ELSIF (TG_OP = 'UPDATE') THEN
+                    INSERT INTO {self.log} (change_op, {cols}) VALUES ('U', {new});
+                    IF ROW({old}) IS DISTINCT FROM ROW({new}) THEN
+                        INSERT INTO {self.log} (change_op, {cols}) VALUES ('U', {old});
+                    END IF;
+                    RETURN NEW;
+                ELSIF (TG_OP = 'INSERT') THEN
+                    INSERT INTO {self.log} (change_op, {cols}) VALUES ('I', {new});
+                    RETURN NEW;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql""")
+        exists = await conn.fetchval(
+            "SELECT true FROM pg_trigger WHERE tgrelid = $1::regclass AND tgname = $2", self.table, self.func)
+        if not exists:
+            async with conn.transaction():
+                await conn.execute(f"SET LOCAL lock_timeout = '{int(self.args.lock_timeout * 1000)}ms'")
+                await conn.execute(f"CREATE TRIGGER {self.func} AFTER INSERT OR UPDATE OR DELETE ON {self.table} "
+                                   f"FOR EACH ROW EXECUTE FUNCTION {self.func}()")
+            print(f"capturing changes of {self.table} into {self.log}")
+
+    async def remove(self, conn):
+        # chamado dentro da transação do cutover, depois do rename (a origem agora é <tabela>_old)
+        await conn.execute(f"DROP TRIGGER IF EXISTS {self.func} ON {self.table}_old")
+        await conn.execute(f"DROP FUNCTION IF EXISTS {self.func}()")
+        await conn.execute(f"DROP TABLE IF EXISTS {self.log}")
+
+    def key_match(self, a, b):
+        return ' AND '.join(f"{a}.{quote_ident(c)} = {b}.{quote_ident(c)}" for c, _ in self.pk)
+
+    async def lag(self, conn):
+        """(alterações pendentes, idade em segundos da mais antiga)."""
+        row = await conn.fetchrow(f"SELECT count(*), extract(epoch FROM clock_timestamp() - min(changed_at)) FROM {self.log}")
+        return row[0], float(row[1] or 0.0)
+
+    async def replay_batch(self, conn, limit):
+        """Reaplica até `limit` entradas do log numa transação; devolve quantas entradas consumiu."""
+        names = [c for c, _ in self.pk]
+        rows = await conn.fetch(f"SELECT change_id, {', '.join(quote_ident(c) for c in names)} FROM {self.log} ORDER BY change_id LIMIT $1", limit)
+        if not rows:
+            return 0
+        keys = sorted({tuple(r[c] for c in names) for r in rows})
+        arrays = [[k[i] for k in keys] for i in range(len(names))]
+        unnest = ', '.join(f"${i + 1}::{t}[]" for i, (_, t) in enumerate(self.pk))
+        k_cols = ', '.join(quote_ident(c) for c in names)
+        match_new = self.key_match('n', 'k')
+        match_src = self.key_match('o', 'k')
+        col_list = ', '.join(quote_ident(c) for c in self.columns)
+        src_list = ', '.join(f"o.{quote_ident(c)}" for c in self.columns)
+        await conn.execute(f"DELETE FROM {self.new_table} n USING unnest({unnest}) AS k({k_cols}) WHERE {match_new}", *arrays)
+        await conn.execute(f"INSERT INTO {self.new_table} ({col_list}) SELECT {src_list} FROM {self.table} o "
+                           f"JOIN unnest({unnest}) AS k({k_cols}) ON {match_src}", *arrays)
+        await conn.execute(f"DELETE FROM {self.log} WHERE change_id = ANY($1::bigint[])", [r['change_id'] for r in rows])
+        return len(rows)
+
+    async def catch_up(self, conn, max_lag_rows):
+        """Reaplica em lotes até sobrarem no máximo max_lag_rows pendentes; mostra o lag a cada passada."""
+        while True:
+            t0 = time.perf_counter()
+            applied = 0
+            while True:
+                async with conn.transaction():
+                    n = await self.replay_batch(conn, self.args.replay_batch)
+                applied += n
+                if n < self.args.replay_batch or time.perf_counter() - t0 >= self.args.progress_interval:
+                    break
+            pending, age = await self.lag(conn)
+            dt = max(time.perf_counter() - t0, 1e-6)
+            print(f"[{time.strftime('%H:%M:%S')}] catch-up: applied={applied} ({applied / dt:,.0f}/s) "
+                  f"lag={pending} changes, oldest {age:.1f}s", flush=True)
+            if pending <= max_lag_rows:
+                return pending
+
+    async def cutover(self, conn):
+        """LOCK EXCLUSIVE na origem, aplica o resto do log e renomeia; devolve os segundos com o lock.
+
+        O lock_timeout vale para a transação inteira: o ACCESS EXCLUSIVE que o rename precisa
+        (upgrade do EXCLUSIVE) também desiste em --lock-timeout em vez de ficar na fila atrás de
+        leituras longas com as escritas paradas. LockNotAvailableError desfaz tudo (online_finish
+        tenta de novo depois de mais um catch-up).
+        """
+        async with conn.transaction():
+            await conn.execute(f"SET LOCAL lock_timeout = '{int(self.args.lock_timeout * 1000)}ms'")
+            t_wait = time.perf_counter()
+            await conn.execute(f"LOCK TABLE {self.table} IN EXCLUSIVE MODE")
+            t_locked = time.perf_counter()
+            remaining = 0
+            while True:
+                n = await self.replay_batch(conn, self.args.replay_batch)
+                remaining += n
+                if n == 0:
+                    break
+            t_upgrade = time.perf_counter()
+            await conn.execute(f"LOCK TABLE {self.table}, {self.new_table} IN ACCESS EXCLUSIVE MODE")
+            upgrade = time.perf_counter() - t_upgrade
+            await rename_tables(conn, self.args)
+            await self.remove(conn)
+        held = time.perf_counter() - t_locked
+        print(f"cutover: waited {t_locked - t_wait:.3f}s for the lock, replayed {remaining} changes, "
+              f"waited {upgrade:.3f}s for ACCESS EXCLUSIVE, lock held {held:.3f}s")
+        return held
+
+
+async def online_finish(conn, capture, args):
+    """Catch-up até o lag ficar pequeno e, com --swap, o cutover (com novas tentativas se o lock não vier)."""
+    await capture.catch_up(conn, args.max_lag_rows)
+    if not args.swap:
+        print(f"changes are still being captured in {capture.log}; run again with --swap to cut over")
+        return 0
+    for attempt in range(1, args.cutover_retries + 2):
+        try:
+            await capture.cutover(conn)
+            print(f"{args.table} -> {args.table}_old, {args.new_table} -> {args.table}")
+            return 0
+        except asyncpg.LockNotAvailableError:
+            print(f"cutover attempt {attempt}: lock not granted within {args.lock_timeout}s", file=sys.stderr)
+            await capture.catch_up(conn, args.max_lag_rows)
+    return 1
+
+
+async def run(args):
+    conn_info = dict(user=args.user, password=args.password, database=args.dbname, host=args.host, port=args.port)
+    args.new_table = args.new_table or args.table + '_new'
+    job = f"{args.table}->{args.new_table}"
+
+    conn = await asyncpg.connect(**conn_info)
+    try:
+        if args.setup:
+            await setup_tables(conn, args)
+        await conn.execute(PROGRESS_DDL.format(table=args.progress_table))
+        if args.reset:
+            await conn.execute(f"DELETE FROM {args.progress_table} WHERE job = $1", job)
+            await conn.execute(PLAN_DDL.format(table=f"{args.progress_table}_plan"))
+            await conn.execute(f"DELETE FROM {args.progress_table}_plan WHERE job = $1", job)
+
+        columns = await table_columns(conn, args.new_table)
+        select_list = ', '.join(quote_ident(c) for c in columns)
+        capture = None
+        if args.online:
+            # o trigger entra antes de qualquer bloco ser lido: nada escrito depois disso se perde
+            capture = ChangeCapture(args, await ChangeCapture.primary_key(conn, args.table), columns)
+            await capture.install(conn)
+        estimated = await conn.fetchval("SELECT greatest(reltuples, 0)::bigint FROM pg_class WHERE oid = $1::regclass", args.table)
+
+        if args.split == 'pk':
+            key = await pk_column(conn, args.table)
+            lo, hi = await conn.fetchrow(f"SELECT min({quote_ident(key)}), max({quote_ident(key)}) FROM {args.table}")
+            lo, hi, step = await chunk_plan(conn, args, job, lo, hi, args.chunk_rows)
+            chunks = pk_chunks(lo, hi, step) if lo is not None else []
+            query = f"SELECT {select_list} FROM {args.table} WHERE {quote_ident(key)} >= $1::text::bigint AND {quote_ident(key)} < $2::text::bigint"
+            outside = f"{quote_ident(key)} < $1::text::bigint OR {quote_ident(key)} >= $2::text::bigint"
+        else:
+            col = quote_ident(args.partition_column)
+            from_date, to_date = args.from_date, args.to_date
+            if not (from_date and to_date):
+                lo, hi = await conn.fetchrow(f"SELECT min({col})::date, max({col})::date FROM {args.table}")
+                from_date, to_date = from_date or lo, to_date or hi
+            from_date, to_date, _ = await chunk_plan(conn, args, job, from_date, to_date)
+            chunks = month_chunks(args.table, from_date, to_date) if from_date else []
+            query = f"SELECT {select_list} FROM {args.table} WHERE {col} >= $1::text::date AND {col} < $2::text::date"
+            outside = f"{col} IS NULL OR {col} < $1::text::date OR {col} >= $2::text::date"
+        if not chunks:
+            outside = "$1::text IS NULL AND $2::text IS NULL"  # sem blocos: toda linha está de fora
+        bounds = (chunks[0].lo, chunks[-1].hi) if chunks else (None, None)
+
+        done = {(r['lo'], r['hi']) for r in await conn.fetch(f"SELECT lo, hi FROM {args.progress_table} WHERE job = $1", job)}
+        copied_before = await conn.fetchval(f"SELECT coalesce(sum(rows_copied), 0)::bigint FROM {args.progress_table} WHERE job = $1", job)
+        todo = [c for c in chunks if (c.lo, c.hi) not in done]
+    finally:
+        await conn.close()
+
+    print(f"{job}: {len(chunks)} chunks, {len(chunks) - len(todo)} already copied ({copied_before} rows), "
+          f"{len(todo)} to go with {args.jobs} jobs")
+    progress = Progress(len(chunks), len(chunks) - len(todo), max(estimated - copied_before, 0))
+
+    if todo:
+        settings = {'application_name': 'pg_partition_copy'}
+        dst_settings = dict(settings, synchronous_commit='off') if args.async_commit else settings
+        src_pool = await asyncpg.create_pool(**conn_info, min_size=1, max_size=args.jobs, server_settings=settings)
+        dst_pool = await asyncpg.create_pool(**conn_info, min_size=1, max_size=args.jobs, server_settings=dst_settings)
+        pending = asyncio.Queue()
+        for c in todo:
+            pending.put_nowait(c)
+
+        async def reporter():
+            while True:
+                await asyncio.sleep(args.progress_interval)
+                progress.report()
+
+        rep = asyncio.create_task(reporter())
+        try:
+            await asyncio.gather(*(worker(pending, src_pool, dst_pool, args, job, query, columns, progress)
+                                   for _ in range(args.jobs)))
+        finally:
+            rep.cancel()
+            await asyncio.gather(rep, return_exceptions=True)
+            await src_pool.close()
+            await dst_pool.close()
+        progress.report()
+
+    elapsed = time.perf_counter() - progress.started
+    print(f"copied {progress.rows} rows in {elapsed:.1f}s ({progress.rows / max(elapsed, 1e-6):,.0f} rows/s), "
+          f"{progress.failed} chunk(s) failed")
+
+    if progress.failed:
+        print("there are failed chunks: run again to retry them (completed chunks are skipped)", file=sys.stderr)
+        return 1
+    if capture is not None:
+        conn = await asyncpg.connect(**conn_info, server_settings={'application_name': 'pg_partition_copy'})
+        try:
+            # com escritas concorrentes a contagem não fecha; o que importa é não haver linhas
+            # antigas fora dos blocos (as escritas depois do trigger entram pelo log)
+            missing = await uncovered_rows(conn, args, outside, bounds, capture) if args.swap else 0
+            if missing:
+                print(f"{missing} rows of {args.table} fall outside the copied ranges (or have a NULL key); "
+                      f"cutover aborted", file=sys.stderr)
+                return 1
+            return await online_finish(conn, capture, args)
+        finally:
+            await conn.close()
+    if args.swap:
+        conn = await asyncpg.connect(**conn_info)
+        try:
+            if not await verify_counts(conn, args):
+                return 1
+            await swap_tables(conn, args)
+        finally:
+            await conn.close()
+    return 0
+
+
+def parse_date(value):
+    return date.fromisoformat(value)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description='Parallel, chunked and resumable copy for partition_existing_table')
+    p.add_argument('--host', required=True)
+    p.add_argument('--port', type=int, default=5432)
+    p.add_argument('--dbname', required=True)
+    p.add_argument('--user', required=True)
+    p.add_argument('--password', required=True)
+    p.add_argument('table', help='original table (the partitioned copy is <table>_new)')
+    p.add_argument('--partition-column', required=True)
+    p.add_argument('--from', dest='from_date', type=parse_date, help='first month (default: min of the partition column)')
+    p.add_argument('--to', dest='to_date', type=parse_date, help='last month (default: max of the partition column)')
+    p.add_argument('--new-table', help='target table (default <table>_new)')
+    p.add_argument('--schema', default='public', help='schema of the target table for COPY')
+    p.add_argument('--split', choices=('partition', 'pk'), default='partition',
+                   help='partition: one chunk per month/partition; pk: ranges of --chunk-rows on an integer PK')
+    p.add_argument('--chunk-rows', type=int, default=1_000_000, help='PK range size per chunk for --split pk')
+    p.add_argument('--jobs', type=int, default=4, help='chunks copied concurrently')
+    p.add_argument('--retries', type=int, default=2, help='retries per chunk before giving up on it')
+    p.add_argument('--progress-table', default=PROGRESS_TABLE, help='checkpoint table')
+    p.add_argument('--reset', action='store_true', help='forget the checkpoints and chunk plan of this table (copy from scratch)')
+    p.add_argument('--setup', action='store_true',
+                   help='run create_partitioned_table + generate_and_execute_partition_scripts first (needs --from/--to)')
+    p.add_argument('--swap', action='store_true', help='rename the tables like partition_existing_table when every chunk is done')
+    p.add_argument('--lock-timeout', type=float, default=10.0, help='lock_timeout (s) for --swap and the online cutover')
+    p.add_argument('--online', action='store_true',
+                   help='capture changes with a trigger during the copy and replay them (catch-up) before the cutover')
+    p.add_argument('--replay-batch', type=int, default=5000, help='--online: log entries replayed per transaction')
+    p.add_argument('--max-lag-rows', type=int, default=1000,
+                   help='--online: pending changes at which catch-up stops and the cutover starts')
+    p.add_argument('--cutover-retries', type=int, default=3, help='--online: cutover attempts after a lock timeout')
+    p.add_argument('--async-commit', action='store_true', help='synchronous_commit=off on the target connections')
+    p.add_argument('--progress-interval', type=float, default=10.0)
+    p.add_argument('--verbose', action='store_true', help='print every finished chunk')
+    return p.parse_args()
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run(parse_args())))
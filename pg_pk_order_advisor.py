@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+pg_pk_order_advisor.py — sugestão de ordem das colunas da chave primária sem varrer a tabela inteira
+
+O usp_sugerir_nova_ordem_chave_primaria.sql faz um CROSS JOIN da tabela com o information_schema e
+um COUNT(DISTINCT col) por coluna da PK: a tabela inteira é lida uma vez para cada coluna. Aqui a
+mesma regra (ordem por densidade = distintos / linhas, maior primeiro, empate pelo nome) é
+calculada assim:
+  ✓ primeiro pelo pg_stats.n_distinct do último ANALYZE (nenhuma linha lida), quando todas as
+    colunas têm estatística e a tabela não mudou demais desde então (n_mod_since_analyze)
+  ✓ senão uma única leitura TABLESAMPLE que calcula os distintos de todas as colunas de uma vez:
+    o servidor devolve só hashtextextended(col::text) e o cliente alimenta um sketch HyperLogLog
+    por coluna (memória constante, independente do tamanho da amostra)
+  ✓ várias tabelas em paralelo (--jobs)
+  ✓ para cada tabela: confiança da ordem sugerida e linhas lidas x linhas que o método exato leria
+
+Confiança: cada densidade tem um erro relativo estimado (stats: 10% + fração modificada desde o
+ANALYZE; amostra: erro do HLL + 1/sqrt(linhas da amostra)). Se todas as colunas vizinhas na ordem
+sugerida estão separadas por mais de 3x esse erro a confiança é 'high', por mais de 1x 'medium',
+senão 'low' (a ordem de alguma dupla pode inverter). --verify roda o método exato (uma só leitura
+com COUNT(DISTINCT) de todas as colunas) para conferir.
+
+Na amostra, a ordem e a confiança saem dos distintos vistos na própria amostra (distintos / linhas
+lidas), não dos distintos extrapolados para a tabela: a extrapolação é uma heurística sem erro
+conhecido que só aumenta a distância entre as colunas (nunca troca a ordem). Com SYSTEM a amostra é
+por bloco e, em dados agrupados fisicamente (uma coluna que segue a ordem de inserção), os distintos
+de uma coluna podem sair bem abaixo do real: a confiança fica limitada a 'medium', a não ser que a
+amostra cubra a tabela inteira. Use --sample-method BERNOULLI (lê todos os blocos) quando precisar
+de 'high' por amostra.
+
+Dependências:
+  pip install asyncpg
+
+Exemplo de uso:
+  # todas as tabelas com PK composta do schema public
+  python3 pg_pk_order_advisor.py --host 127.0.0.1 --dbname app --user postgres --password 1234 --schema public
+
+  # tabelas específicas, sempre por amostra, 200 mil linhas por tabela
+  python3 pg_pk_order_advisor.py --host 127.0.0.1 --dbname app --user postgres --password 1234 \
+    --table public.pedidos_itens --table public.movimento --method sample --sample-rows 200000
+"""
+
+import argparse
+import asyncio
+import asyncpg
+import json
+import math
+import sys
+import time
+
+HLL_PRECISION = 14  # 16384 registradores, erro padrão ~0,8%
+STATS_BASE_ERROR = 0.10  # n_distinct do ANALYZE vem de ~300 x statistics_target linhas
+MAX_MOD_RATIO = 0.10  # acima disso as estatísticas são consideradas velhas
+
+TABLES_SQL = """
+SELECT n.nspname AS schema, c.relname AS table, c.reltuples::bigint AS reltuples,
+       coalesce(s.n_mod_since_analyze, 0) AS n_mod,
+       array_agg(a.attname::text ORDER BY k.ord) AS pk
+  FROM pg_index i
+  JOIN pg_class c ON c.oid = i.indrelid
+  JOIN pg_namespace n ON n.oid = c.relnamespace
+  LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+ CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+  JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+ WHERE i.indisprimary
+   AND c.relkind IN ('r', 'p', 'm')
+   AND ($1::text[] IS NULL OR n.nspname = ANY($1))
+   AND ($2::text[] IS NULL OR format('%s.%s', n.nspname, c.relname) = ANY($2))
+ GROUP BY n.nspname, c.relname, c.reltuples, s.n_mod_since_analyze
+HAVING count(*) >= $3
+ ORDER BY 1, 2
+"""
+
+STATS_SQL = """
+SELECT attname::text, n_distinct FROM pg_stats
+ WHERE schemaname = $1 AND tablename = $2 AND attname = ANY($3::text[]) AND NOT inherited
+"""
+
+
+def quote_ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class HyperLogLog:
+    """HLL de 2^p registradores sobre hashes de 64 bits (com a correção de linear counting)."""
+
+    def __init__(self, p=HLL_PRECISION):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+        self.shift = 64 - p
+        self.mask = (1 << self.shift) - 1
+
+    @property
+    def error(self):
+        return 1.04 / math.sqrt(self.m)
+
+    def add(self, h):
+        h &= 0xFFFFFFFFFFFFFFFF
+        idx = h >> self.shift
+        rho = self.shift - (h & self.mask).bit_length() + 1
+        if rho > self.registers[idx]:
+            self.registers[idx] = rho
+
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        est = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if est <= 2.5 * m and zeros:
+            est = m * math.log(m / zeros)
+        return est
+
+
+def table_distinct(d, n, total):
+    """Distintos na tabela a partir de d distintos em n linhas de amostra (total linhas na tabela).
+
+    Heurística entre os dois extremos: coluna saturada (d pequeno perto de n: poucos valores,
+    todos já apareceram) fica ~d; coluna quase única (d ~ n) escala até d * total / n. Só informativa:
+    a ordem e a confiança usam sample_density.
+    """
+    if n <= 0 or d <= 0:
+        return 0.0
+    return min(float(total), d * (total / n) ** min(1.0, d / n))
+
+
+def confidence(cols, key='density'):
+    """'high' / 'medium' / 'low' pela separação entre colunas vizinhas na ordem sugerida."""
+    worst = math.inf
+    for a, b in zip(cols, cols[1:]):
+        if b[key] <= 0:
+            continue
+        err = a['error'] + b['error']
+        worst = min(worst, (a[key] / b[key] - 1) / err if err else math.inf)
+    if worst >= 3:
+        return 'high'
+    return 'medium' if worst >= 1 else 'low'
+
+
+def suggest(cols, key='density'):
+    return sorted(cols, key=lambda c: (-c[key], c['column']))
+
+
+async def estimate_rows(conn, target):
+    """reltuples quando a tabela nunca passou por ANALYZE: 1% de amostra por bloco, ou count(*) se for pequena."""
+    n = await conn.fetchval(f"SELECT count(*) FROM {target} TABLESAMPLE SYSTEM (1)")
+    return n * 100 if n else await conn.fetchval(f"SELECT count(*) FROM {target}")
+
+
+async def from_stats(conn, t, total):
+    rows = {r['attname']: r['n_distinct'] for r in await conn.fetch(STATS_SQL, t['schema'], t['table'], t['pk'])}
+    if len(rows) < len(t['pk']) or total <= 0:
+        return None
+    mod_ratio = t['n_mod'] / total
+    cols = []
+    for col in t['pk']:
+        nd = rows[col]
+        distinct = -nd * total if nd < 0 else nd
+        cols.append({'column': col, 'distinct': distinct, 'density': distinct / total,
+                     'error': STATS_BASE_ERROR + mod_ratio})
+    return cols, mod_ratio
+
+
+async def from_sample(conn, t, target, total, args):
+    pct = min(100.0, 100.0 * args.sample_rows / max(total, 1))
+    hashes = ', '.join(f"hashtextextended({quote_ident(c)}::text, 0)" for c in t['pk'])
+    sql = f"SELECT {hashes} FROM {target} TABLESAMPLE {args.sample_method} ({pct}) REPEATABLE ({args.seed})"
+    sketches = [HyperLogLog(args.precision) for _ in t['pk']]
+    n = 0
+    async with conn.transaction():
+        async for rec in conn.cursor(sql, prefetch=args.prefetch):
+            n += 1
+            for sk, h in zip(sketches, rec):
+                sk.add(h)
+    total = max(total, n)
+    cols = []
+    for col, sk in zip(t['pk'], sketches):
+        d = min(sk.count(), n)
+        distinct = table_distinct(d, n, total)
+        cols.append({'column': col, 'distinct': distinct, 'density': distinct / total if total else 0.0,
+                     'sample_distinct': round(d), 'sample_density': d / n if n else 0.0, 'error': sk.error + 1 / math.sqrt(max(n, 1))})
+    return cols, n, pct
+
+
+async def exact(conn, t, target):
+    """O cálculo do usp_sugerir_nova_ordem_chave_primaria, mas em uma única leitura."""
+    counts = ', '.join(f"count(DISTINCT {quote_ident(c)})" for c in t['pk'])
+    row = await conn.fetchrow(f"SELECT count(*), {counts} FROM {target}")
+    total = row[0]
+    cols = [{'column': c, 'distinct': row[i + 1], 'density': row[i + 1] / total if total else 0.0}
+            for i, c in enumerate(t['pk'])]
+    return [c['column'] for c in suggest(cols)], total
+
+
+async def advise(pool, t, args):
+    t0 = time.perf_counter()
+    target = f"{quote_ident(t['schema'])}.{quote_ident(t['table'])}"
+    async with pool.acquire() as conn:
+        total = t['reltuples'] if t['reltuples'] >= 0 else await estimate_rows(conn, target)
+        result = None
+        if args.method in ('auto', 'stats'):
+            stats = await from_stats(conn, t, total)
+            if stats and (args.method == 'stats' or stats[1] <= args.max_mod_ratio):
+                cols, mod_ratio = stats
+                result = {'method': 'stats', 'rows_read': 0, 'mod_since_analyze': round(mod_ratio, 4)}
+            elif args.method == 'stats':
+                return {'table': f"{t['schema']}.{t['table']}", 'error': 'no pg_stats for every pk column (run ANALYZE)'}
+        if result is None:
+            cols, n, pct = await from_sample(conn, t, target, total, args)
+            result = {'method': 'sample', 'rows_read': n, 'sample_percent': round(pct, 4)}
+        if args.verify:
+            exact_order, total = await exact(conn, t, target)
+            result['exact_order'] = exact_order
+
+    key = 'sample_density' if result['method'] == 'sample' else 'density'
+    ranked = suggest(cols, key)
+    conf = confidence(ranked, key)
+    if result['method'] == 'sample' and args.sample_method == 'SYSTEM' and result['sample_percent'] < 100 and conf == 'high':
+        conf = 'medium'
+    current = t['pk']
+    suggested = [c['column'] for c in ranked]
+    result.update({
+        'table': f"{t['schema']}.{t['table']}",
+        'rows': int(total),
+        'current_order': current,
+        'suggested_order': suggested,
+        'already_best': suggested == current,
+        'confidence': conf,
+        # o usp_sugerir_nova_ordem_chave_primaria lê a tabela inteira para cada coluna da PK
+        'exact_rows_read': int(total) * len(current),
+        'columns': [{k: (round(v, 6) if isinstance(v, float) else v) for k, v in c.items()} for c in ranked],
+        'seconds': round(time.perf_counter() - t0, 3),
+    })
+    if 'exact_order' in result:
+        result['exact_agrees'] = result['exact_order'] == suggested
+    return result
+
+
+async def run(args):
+    conn_info = dict(user=args.user, password=args.password, database=args.dbname, host=args.host, port=args.port)
+    pool = await asyncpg.create_pool(**conn_info, min_size=1, max_size=args.jobs,
+                                     server_settings={'application_name': 'pg_pk_order_advisor'})
+    try:
+        async with pool.acquire() as conn:
+            tables = await conn.fetch(TABLES_SQL, args.schema or None, args.table or None, args.min_columns)
+        sem = asyncio.Semaphore(args.jobs)
+
+        async def one(t):
+            async with sem:
+                try:
+                    return await advise(pool, t, args)
+                except asyncpg.PostgresError as e:
+                    return {'table': f"{t['schema']}.{t['table']}", 'error': str(e)}
+
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(one(dict(t)) for t in tables))
+    finally:
+        await pool.close()
+
+    if args.format == 'json':
+        json.dump(results, sys.stdout, indent=2, default=str)
+        print()
+    else:
+        for r in results:
+            if 'suggested_order' not in r:
+                print(f"{r['table']}: ERROR {r['error']}")
+                continue
+            verdict = 'current order is already the best' if r['already_best'] else ', '.join(r['suggested_order'])
+            print(f"{r['table']} ({r['rows']} rows): {verdict}")
+            read = r['rows_read']
+            saved = f", {100 * (1 - read / r['exact_rows_read']):.2f}% fewer" if r['exact_rows_read'] else ''
+            print(f"    current {', '.join(r['current_order'])} | method {r['method']} | confidence {r['confidence']}"
+                  f" | rows read {read} vs {r['exact_rows_read']} exact{saved} | {r['seconds']:.2f}s")
+            if 'exact_order' in r:
+                print(f"    exact   {', '.join(r['exact_order'])} ({'agrees' if r['exact_agrees'] else 'DIFFERS'})")
+        print(f"{len(results)} table(s) in {time.perf_counter() - t0:.2f}s")
+    return 1 if any('error' in r for r in results) else 0
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description='Primary key column order advisor (pg_stats / TABLESAMPLE + HyperLogLog)')
+    p.add_argument('--host', required=True)
+    p.add_argument('--port', type=int, default=5432)
+    p.add_argument('--dbname', required=True)
+    p.add_argument('--user', required=True)
+    p.add_argument('--password', required=True)
+    p.add_argument('--schema', action='append', help='only tables of this schema (repeatable)')
+    p.add_argument('--table', action='append', help='schema.table to analyse (repeatable; default: every table)')
+    p.add_argument('--min-columns', type=int, default=2, help='ignore primary keys with fewer columns')
+    p.add_argument('--method', choices=('auto', 'stats', 'sample'), default='auto',
+                   help='auto: pg_stats when fresh enough, otherwise a sample')
+    p.add_argument('--max-mod-ratio', type=float, default=MAX_MOD_RATIO,
+                   help='n_mod_since_analyze / rows above which pg_stats is not trusted (auto)')
+    p.add_argument('--sample-rows', type=int, default=100000, help='target rows read per table')
+    p.add_argument('--sample-method', choices=('SYSTEM', 'BERNOULLI'), default='SYSTEM',
+                   help='SYSTEM reads only the sampled blocks (confidence capped at medium); '
+                        'BERNOULLI is unbiased for clustered data but reads every block')
+    p.add_argument('--seed', type=int, default=0, help='REPEATABLE seed of the sample')
+    p.add_argument('--precision', type=int, default=HLL_PRECISION, help='HyperLogLog precision (2^p registers)')
+    p.add_argument('--prefetch', type=int, default=10000, help='rows per cursor round trip')
+    p.add_argument('--jobs', type=int, default=4, help='tables analysed at the same time')
+    p.add_argument('--verify', action='store_true', help='also run the exact COUNT(DISTINCT) (one full scan) and compare')
+    p.add_argument('--format', choices=('table', 'json'), default='table')
+    return p.parse_args()
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run(parse_args())))
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+pg_split_blob.py — gravação e leitura em streaming dos blobs quebrados em pedaços do split_blob.sql
+
+O inserir_dados do split_blob.sql recebe o blob inteiro como um parâmetro TEXT (o cliente precisa
+montar a string toda em memória) e grava na tabela dados em pedaços de 1000 caracteres. Aqui o
+mesmo formato é gravado e lido do lado do cliente, com memória constante:
+
+  ✓ write_blob: lê o stream / iterador / texto em blocos (arquivos pelo iter_file), corta em pedaços de --part-size
+    caracteres e carrega todos com um único COPY (copy_records_to_table), numa transação
+  ✓ read_blob: devolve os pedaços na ordem de sequencial usando um cursor no servidor
+    (usa o índice (identificador, sequencial) do split_blob.sql), sem montar o blob inteiro; quem
+    parar antes do fim fecha o gerador (contextlib.aclosing) para a transação do cursor terminar
+  ✓ o resultado é o mesmo do reconstruir_dados(identificador)
+
+O formato do split_blob.sql é texto (parte VARCHAR(1000)): arquivos são lidos como --encoding
+(padrão utf-8) e os pedaços contam caracteres, não bytes. Para binários, grave em base64.
+
+Dependências:
+  pip install asyncpg
+
+Exemplo de uso:
+  # grava (imprime o identificador gerado)
+  python3 pg_split_blob.py --host 127.0.0.1 --dbname app --user postgres --password 1234 put grande.xml
+  cat grande.json | python3 pg_split_blob.py --host 127.0.0.1 --dbname app --user postgres --password 1234 put -
+
+  # lê de volta para um arquivo (ou stdout)
+  python3 pg_split_blob.py --host 127.0.0.1 --dbname app --user postgres --password 1234 \
+    get 2b1c...-uuid -o copia.xml
+
+  Como biblioteca:
+    ident, _, _ = await write_blob(conn, iter_file('grande.xml'))   # uma str é conteúdo, não caminho
+    async with aclosing(read_blob(conn, ident)) as partes:
+        async for parte in partes:
+            out.write(parte)
+"""
+
+import argparse
+import asyncio
+import asyncpg
+import codecs
+import sys
+from contextlib import aclosing
+import time
+import uuid
+
+TABLE = 'dados'
+PART_SIZE = 1000  # mesmo tamanho_parte do inserir_dados / VARCHAR(1000) da tabela
+READ_SIZE = 1 << 16  # bytes lidos do arquivo por vez
+CURSOR_PREFETCH = 1000  # pedaços buscados por ida ao servidor na leitura
+
+
+def iter_file(path, encoding='utf-8', read_size=READ_SIZE):
+    """Texto em blocos do arquivo em `path` ('-' = stdin)."""
+    if path == '-':
+        yield from iter_text(sys.stdin.buffer, encoding, read_size)
+        return
+    with open(path, 'rb') as fh:
+        yield from iter_text(fh, encoding, read_size)
+
+
+def iter_text(source, encoding='utf-8', read_size=READ_SIZE):
+    """Texto em blocos a partir de um arquivo aberto (texto ou binário), str/bytes (o próprio conteúdo)
+    ou iterador deles. Caminhos vão pelo iter_file."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    if hasattr(source, 'read'):
+        pieces = iter(lambda: source.read(read_size), source.read(0))
+    elif isinstance(source, (bytes, bytearray)):
+        pieces = (bytes(source[i:i + read_size]) for i in range(0, len(source), read_size))
+    elif isinstance(source, str):
+        pieces = (source,)
+    else:
+        pieces = source
+    for piece in pieces:
+        yield decoder.decode(piece) if isinstance(piece, (bytes, bytearray)) else piece
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_parts(pieces, part_size=PART_SIZE):
+    """Corta um fluxo de textos em pedaços de part_size caracteres (o último pode ser menor)."""
+    buf = ''
+    for piece in pieces:
+        if not piece:
+            continue
+        buf = buf + piece if buf else piece
+        if len(buf) < part_size:
+            continue
+        end = len(buf) - len(buf) % part_size
+        for i in range(0, end, part_size):
+            yield buf[i:i + part_size]
+        buf = buf[end:]
+    if buf:
+        yield buf
+
+
+async def write_blob(conn, source, identificador=None, *, table=TABLE, schema_name=None,
+                     part_size=PART_SIZE, encoding='utf-8'):
+    """Grava `source` (ver iter_text; para um arquivo, iter_file(caminho)) na tabela do split_blob.sql com um
+    COPY; devolve (identificador, pedaços, caracteres)."""
+    identificador = identificador or uuid.uuid4()
+    stats = [0, 0]
+
+    async def records():
+        for seq, parte in enumerate(iter_parts(iter_text(source, encoding), part_size), 1):
+            stats[0] = seq
+            stats[1] += len(parte)
+            yield (seq, parte, identificador)
+
+    async with conn.transaction():
+        await conn.copy_records_to_table(table, records=records(), schema_name=schema_name,
+                                         columns=('sequencial', 'parte', 'identificador'))
+    return identificador, stats[0], stats[1]
+
+
+async def read_blob(conn, identificador, *, table=TABLE, prefetch=CURSOR_PREFETCH):
+    """Gera os pedaços de `identificador` em ordem de sequencial via cursor no servidor.
+
+    A transação do cursor só termina quando o gerador termina ou é fechado (aclose / aclosing).
+    """
+    tr = conn.transaction(readonly=True)
+    await tr.start()
+    try:
+        cur = conn.cursor(f"SELECT parte FROM {table} WHERE identificador = $1 ORDER BY sequencial",
+                          identificador, prefetch=prefetch)
+        async for rec in cur:
+            yield rec[0]
+    finally:
+        # também no consumidor que parou no meio: só leitura, rollback basta
+        if not conn.is_closed():
+            await tr.rollback()
+
+
+async def delete_blob(conn, identificador, *, table=TABLE):
+    status = await conn.execute(f"DELETE FROM {table} WHERE identificador = $1", identificador)
+    return int(status.split()[-1])
+
+
+async def run(args):
+    conn_info = dict(user=args.user, password=args.password, database=args.dbname, host=args.host, port=args.port)
+    conn = await asyncpg.connect(**conn_info)
+    try:
+        t0 = time.perf_counter()
+        if args.command == 'put':
+            ident = uuid.UUID(args.id) if args.id else None
+            ident, parts, chars = await write_blob(conn, iter_file(args.file, args.encoding), ident, table=args.table,
+                                                   part_size=args.part_size, encoding=args.encoding)
+            print(ident)
+            dt = time.perf_counter() - t0
+            print(f"{parts} parts, {chars} chars in {dt:.2f}s ({chars / max(dt, 1e-6) / 1048576:.1f} M chars/s)", file=sys.stderr)
+        elif args.command == 'get':
+            out = open(args.output, 'w', encoding=args.encoding, newline='') if args.output else sys.stdout
+            parts = chars = 0
+            try:
+                async with aclosing(read_blob(conn, uuid.UUID(args.id), table=args.table, prefetch=args.prefetch)) as partes:
+                    async for parte in partes:
+                        out.write(parte)
+                        parts += 1
+                        chars += len(parte)
+            finally:
+                if args.output:
+                    out.close()
+            if parts == 0:
+                print(f"identificador {args.id} não encontrado", file=sys.stderr)
+                return 1
+            dt = time.perf_counter() - t0
+            print(f"{parts} parts, {chars} chars in {dt:.2f}s", file=sys.stderr)
+        else:
+            print(f"{await delete_blob(conn, uuid.UUID(args.id), table=args.table)} parts deleted", file=sys.stderr)
+    finally:
+        await conn.close()
+    return 0
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description='Streaming write/read of split blobs (split_blob.sql layout)')
+    p.add_argument('--host', required=True)
+    p.add_argument('--port', type=int, default=5432)
+    p.add_argument('--dbname', required=True)
+    p.add_argument('--user', required=True)
+    p.add_argument('--password', required=True)
+    p.add_argument('--table', default=TABLE)
+    p.add_argument('--encoding', default='utf-8')
+    sub = p.add_subparsers(dest='command', required=True)
+    put = sub.add_parser('put', help='split a file (or - for stdin) and load it with COPY')
+    put.add_argument('file')
+    put.add_argument('--id', help='identificador to use (default: new uuid4)')
+    put.add_argument('--part-size', type=int, default=PART_SIZE, help='characters per part (column size)')
+    get = sub.add_parser('get', help='stream a blob back in sequencial order')
+    get.add_argument('id')
+    get.add_argument('-o', '--output', help='output file (default stdout)')
+    get.add_argument('--prefetch', type=int, default=CURSOR_PREFETCH, help='parts fetched per round trip')
+    rm = sub.add_parser('delete', help='delete every part of a blob')
+    rm.add_argument('id')
+    return p.parse_args()
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run(parse_args())))
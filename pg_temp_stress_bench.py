@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+pg_temp_stress_bench.py — matriz de benchmarks com o pg_temp_stress_test_async.py e comparação com baseline
+
+Roda o teste de stress para cada célula de uma matriz conexões × rows_per_table × cenário, repetindo
+cada célula N vezes (um subprocesso por execução, com --summary-json), e guarda tudo num JSON.
+A comparação calcula média e intervalo de confiança (t de Student, 95%) da vazão e dos percentis
+de latência por célula, e o IC da diferença (Welch) entre baseline e candidato. Uma métrica é
+regressão quando piora mais que --threshold % e o IC da diferença não inclui zero; nesse caso o
+processo termina com código 1. Também termina com 1 quando a comparação não pode ser feita: célula
+presente só de um lado (MISSING), execução do candidato que falhou ou célula sem amostras da métrica
+(FAILED).
+
+Dependências:
+  pip install asyncpg
+
+Exemplo de uso:
+  # baseline (antes do upgrade / mudança de configuração)
+  python3 pg_temp_stress_bench.py run --host 127.0.0.1 --dbname testdb --user postgres --password 1234 \
+    --conns 10,50 --rows 1000,10000 --scenarios ctas,copy --repeats 5 --test-duration 60 --out base.json
+
+  # candidato, comparando na hora
+  python3 pg_temp_stress_bench.py run --host 127.0.0.1 --dbname testdb --user postgres --password 1234 \
+    --conns 10,50 --rows 1000,10000 --scenarios ctas,copy --repeats 5 --test-duration 60 --out cand.json \
+    --baseline base.json --threshold 5
+
+  # ou comparar dois resultados já salvos
+  python3 pg_temp_stress_bench.py compare base.json cand.json --threshold 5 --metrics throughput,p50,p99
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pg_temp_stress_test_async as stress
+
+# o import instala os handlers de sinal do teste; aqui Ctrl+C deve interromper o harness
+signal.signal(signal.SIGINT, signal.default_int_handler)
+signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+STRESS_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pg_temp_stress_test_async.py')
+
+# opções que a matriz controla (não repassadas a partir da linha de comando do harness)
+MATRIX_DESTS = ('max_conns', 'rows_per_table', 'scenario_weights', 'summary_json', 'csv_report',
+                'jsonl_report', 'hist_dump', 'ts_interval')
+
+# métrica -> (como extrair do summary, maior é melhor?)
+METRICS = {
+    'throughput': (lambda s, sc: s['throughput_per_s'].get(sc, 0.0), True),
+    'p50': (lambda s, sc: s['latency_ms'][f'{sc}_cycle']['p50'], False),
+    'p90': (lambda s, sc: s['latency_ms'][f'{sc}_cycle']['p90'], False),
+    'p99': (lambda s, sc: s['latency_ms'][f'{sc}_cycle']['p99'], False),
+    'p999': (lambda s, sc: s['latency_ms'][f'{sc}_cycle']['p999'], False),
+    'errors': (lambda s, sc: s['errors'], False),
+}
+
+# t crítico bicaudal 95% por graus de liberdade (acima de 30, aproximação normal)
+T95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+       10: 2.228, 11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131, 16: 2.120, 17: 2.110,
+       18: 2.101, 19: 2.093, 20: 2.086, 21: 2.080, 22: 2.074, 23: 2.069, 24: 2.064, 25: 2.060,
+       26: 2.056, 27: 2.052, 28: 2.048, 29: 2.045, 30: 2.042}
+
+
+def t95(df):
+    if df < 1:
+        return float('inf')
+    return T95.get(int(df), 1.96) if df <= 30 else 1.96
+
+
+def mean_ci(values):
+    """(média, meia-largura do IC 95%, desvio padrão amostral)."""
+    n = len(values)
+    if n == 0:
+        return float('nan'), float('nan'), float('nan')
+    m = sum(values) / n
+    if n == 1:
+        return m, float('inf'), 0.0
+    sd = math.sqrt(sum((v - m) ** 2 for v in values) / (n - 1))
+    return m, t95(n - 1) * sd / math.sqrt(n), sd
+
+
+def welch_ci(a, b):
+    """IC 95% de mean(b) - mean(a) (Welch); (diferença, low, high)."""
+    ma, _, sa = mean_ci(a)
+    mb, _, sb = mean_ci(b)
+    diff = mb - ma
+    if len(a) < 2 or len(b) < 2:
+        return diff, float('-inf'), float('inf')
+    va, vb = sa ** 2 / len(a), sb ** 2 / len(b)
+    se = math.sqrt(va + vb)
+    if se == 0:
+        return diff, diff, diff
+    df = (va + vb) ** 2 / ((va ** 2 / (len(a) - 1)) + (vb ** 2 / (len(b) - 1)))
+    h = t95(df) * se
+    return diff, diff - h, diff + h
+
+
+def split_list(value, conv=str):
+    return [conv(v.strip()) for v in value.split(',') if v.strip()]
+
+
+def scenario_spec(scenario):
+    # mistura de cenários numa célula: 'ctas=3+copy=1' -> --scenario ctas=3,copy=1
+    return scenario.replace('+', ',')
+
+
+def cell_key(conns, rows, scenario):
+    return f"conns={conns},rows={rows},scenario={scenario}"
+
+
+def passthrough_argv(parser, ns):
+    """Reconstrói as opções do teste que não são controladas pela matriz (só as diferentes do padrão)."""
+    argv = []
+    for action in parser._actions:
+        if not action.option_strings or action.dest in MATRIX_DESTS or action.dest == 'help':
+            continue
+        value = getattr(ns, action.dest, action.default)
+        if value == action.default and not action.required:
+            continue
+        if isinstance(action, argparse._StoreTrueAction):
+            if value:
+                argv.append(action.option_strings[0])
+        else:
+            argv += [action.option_strings[0], str(value)]
+    return argv
+
+
+def run_once(base_argv, conns, rows, scenario, log_dir, tag):
+    """Executa o teste em um subprocesso e devolve o summary (dict) ou None em caso de falha."""
+    fd, summary_path = tempfile.mkstemp(prefix='pgbench_', suffix='.json')
+    os.close(fd)
+    cmd = [sys.executable, STRESS_SCRIPT] + base_argv + [
+        '--max-conns', str(conns), '--rows-per-table', str(rows), '--scenario', scenario_spec(scenario),
+        '--summary-json', summary_path]
+    log_path = os.path.join(log_dir, f"{tag}.log") if log_dir else os.devnull
+    try:
+        with open(log_path, 'w') as log:
+            rc = subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT).returncode
+        if rc != 0:
+            print(f"  ! exit code {rc} (log: {log_path})")
+            return None
+        with open(summary_path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"  ! {e}")
+        return None
+    finally:
+        try:
+            os.unlink(summary_path)
+        except OSError:
+            pass
+
+
+def save_results(path, results):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp, path)
+
+
+def run_matrix(args, parser):
+    base_argv = passthrough_argv(parser, args)
+    conns_list = split_list(args.conns, int)
+    rows_list = split_list(args.rows, int)
+    scenarios = split_list(args.scenarios)
+    for sc in scenarios:
+        stress.parse_scenarios(scenario_spec(sc))  # valida antes de começar
+    results = {
+        'meta': {
+            'started_at': datetime.now().isoformat(),
+            'label': args.label,
+            'argv': [a for a in base_argv if a != args.password],
+            'repeats': args.repeats,
+        },
+        'cells': {},
+    }
+    if args.log_dir:
+        os.makedirs(args.log_dir, exist_ok=True)
+
+    cells = list(itertools.product(conns_list, rows_list, scenarios))
+    total = len(cells) * args.repeats
+    done = 0
+    # repetições intercaladas (rodada 1 de todas as células, depois rodada 2, ...) para que
+    # deriva do servidor (autovacuum, cache) não se concentre numa célula só
+    for rep in range(args.repeats):
+        for conns, rows, scenario in cells:
+            key = cell_key(conns, rows, scenario)
+            cell = results['cells'].setdefault(key, {'conns': conns, 'rows': rows, 'scenario': scenario,
+                                                     'runs': [], 'failed': 0})
+            done += 1
+            print(f"[{done}/{total}] {key} repeat {rep + 1}")
+            summary = run_once(base_argv, conns, rows, scenario, args.log_dir, f"{key.replace(',', '_').replace('=', '')}_r{rep + 1}")
+            if summary is not None:
+                summary.pop('args', None)
+                cell['runs'].append(summary)
+                tp = sum(summary['throughput_per_s'].values())
+                print(f"    throughput={tp:.1f}/s errors={summary['errors']}")
+            else:
+                cell['failed'] += 1
+            save_results(args.out, results)
+            if args.cooldown and done < total:
+                time.sleep(args.cooldown)
+    results['meta']['finished_at'] = datetime.now().isoformat()
+    save_results(args.out, results)
+    print(f"Results saved to {args.out}")
+    return results
+
+
+def metric_values(cell, metric):
+    """Valores da métrica por execução (com mistura de cenários, soma a vazão e usa o pior percentil)."""
+    extract, higher_better = METRICS[metric]
+    scenarios = list(stress.parse_scenarios(scenario_spec(cell['scenario'])))
+    values = []
+    for run in cell['runs']:
+        try:
+            per = [extract(run, sc) for sc in scenarios]
+        except KeyError:
+            continue
+        if metric == 'throughput':
+            values.append(sum(per))
+        elif metric == 'errors':
+            values.append(per[0])
+        else:
+            values.append(max(per))
+    return values, higher_better
+
+
+def problem_row(key, metric, verdict, detail):
+    return {'cell': key, 'metric': metric, 'verdict': verdict, 'detail': detail}
+
+
+def compare(baseline, candidate, metrics, threshold):
+    """Compara célula a célula; devolve (linhas do relatório, regressões + células MISSING/FAILED)."""
+    rows = []
+    problems = 0
+    keys = list(candidate['cells']) + [k for k in baseline['cells'] if k not in candidate['cells']]
+    for key in keys:
+        base_cell = baseline['cells'].get(key)
+        cand_cell = candidate['cells'].get(key)
+        if base_cell is None or cand_cell is None:
+            side = 'baseline' if base_cell is None else 'candidate'
+            rows.append(problem_row(key, '-', 'MISSING', f"cell not in the {side}"))
+            problems += 1
+            continue
+        # resultados antigos não têm 'failed': só as execuções que deram certo foram gravadas
+        if cand_cell.get('failed', 0):
+            rows.append(problem_row(key, '-', 'FAILED', f"{cand_cell['failed']} of "
+                                    f"{cand_cell['failed'] + len(cand_cell['runs'])} candidate run(s) failed"))
+            problems += 1
+        for metric in metrics:
+            a, higher_better = metric_values(base_cell, metric)
+            b, _ = metric_values(cand_cell, metric)
+            if not a or not b:
+                side = 'baseline' if not a else 'candidate'
+                rows.append(problem_row(key, metric, 'FAILED', f"no {side} samples"))
+                problems += 1
+                continue
+            ma, ha, _ = mean_ci(a)
+            mb, hb, _ = mean_ci(b)
+            diff, low, high = welch_ci(a, b)
+            pct = (diff / ma * 100) if ma else (0.0 if diff == 0 else float('inf'))
+            worse_pct = -pct if higher_better else pct
+            significant = low > 0 or high < 0
+            if worse_pct > threshold and significant:
+                verdict = 'REGRESSION'
+                problems += 1
+            elif worse_pct < -threshold and significant:
+                verdict = 'improved'
+            elif significant:
+                verdict = 'changed'
+            else:
+                verdict = 'ok'
+            rows.append({
+                'cell': key, 'metric': metric,
+                'baseline_mean': ma, 'baseline_ci': ha, 'baseline_n': len(a),
+                'candidate_mean': mb, 'candidate_ci': hb, 'candidate_n': len(b),
+                'delta_pct': pct,
+                'delta_ci_pct': ((low / ma * 100) if ma else float('nan'), (high / ma * 100) if ma else float('nan')),
+                'verdict': verdict,
+            })
+    return rows, problems
+
+
+def print_report(rows, threshold):
+    print(f"\n{'cell':<38} {'metric':<10} {'baseline':>22} {'candidate':>22} {'delta':>9} {'95% CI delta':>20}  verdict")
+    for r in rows:
+        if 'detail' in r:
+            print(f"{r['cell']:<38} {r['metric']:<10} {r['detail']:>76}  {r['verdict']}")
+            continue
+        base = f"{r['baseline_mean']:.2f} ±{r['baseline_ci']:.2f}"
+        cand = f"{r['candidate_mean']:.2f} ±{r['candidate_ci']:.2f}"
+        lo, hi = r['delta_ci_pct']
+        print(f"{r['cell']:<38} {r['metric']:<10} {base:>22} {cand:>22} {r['delta_pct']:>+8.1f}% "
+              f"{f'[{lo:+.1f}%, {hi:+.1f}%]':>20}  {r['verdict']}")
+    n = sum(1 for r in rows if r['verdict'] == 'REGRESSION')
+    print(f"\n{n} regression(s) above {threshold:.1f}%")
+    missing = sum(1 for r in rows if r['verdict'] in ('MISSING', 'FAILED'))
+    if missing:
+        print(f"{missing} missing or failed cell(s)/metric(s)")
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def report_and_exit_code(baseline, candidate, args):
+    metrics = split_list(args.metrics)
+    unknown = [m for m in metrics if m not in METRICS]
+    if unknown:
+        raise SystemExit(f"unknown metric(s): {', '.join(unknown)} (available: {', '.join(METRICS)})")
+    rows, problems = compare(baseline, candidate, metrics, args.threshold)
+    print_report(rows, args.threshold)
+    if args.report_json:
+        with open(args.report_json, 'w') as f:
+            json.dump({'threshold_pct': args.threshold, 'rows': rows,
+                       'regressions': sum(1 for r in rows if r['verdict'] == 'REGRESSION'),
+                       'missing_or_failed': sum(1 for r in rows if r['verdict'] in ('MISSING', 'FAILED'))}, f, indent=2)
+        print(f"Report saved to {args.report_json}")
+    return 1 if problems else 0
+
+
+def add_compare_options(p):
+    p.add_argument('--threshold', type=float, default=5.0, help='regression threshold in percent (default 5)')
+    p.add_argument('--metrics', default='throughput,p50,p99', help='comma separated: ' + ', '.join(METRICS))
+    p.add_argument('--report-json', help='write the comparison rows to this JSON file')
+
+
+def build_parser():
+    p = argparse.ArgumentParser(description='Benchmark matrix and baseline comparison for pg_temp_stress_test_async.py')
+    sub = p.add_subparsers(dest='command', required=True)
+
+    stress_parser = stress.build_parser(add_help=False)
+    run = sub.add_parser('run', parents=[stress_parser],
+                         help='run the matrix and store the results (options of the stress test are passed through)')
+    run.add_argument('--conns', default='10', help='comma separated --max-conns values')
+    run.add_argument('--rows', default='1000', help='comma separated --rows-per-table values')
+    run.add_argument('--scenarios', default='ctas',
+                     help='comma separated scenarios; use + for a mix, e.g. ctas,copy,ctas=3+copy=1')
+    run.add_argument('--repeats', type=int, default=3, help='runs per cell (>= 2 for confidence intervals)')
+    run.add_argument('--cooldown', type=float, default=2.0, help='seconds to sleep between runs')
+    run.add_argument('--label', default='', help='free text stored in the results (e.g. "16.3 shared_buffers=8GB")')
+    run.add_argument('--log-dir', help='keep the stdout of each run in this directory')
+    run.add_argument('--out', required=True, help='results JSON')
+    run.add_argument('--baseline', help='compare against this results JSON after the run')
+    add_compare_options(run)
+
+    cmp = sub.add_parser('compare', help='compare two stored results')
+    cmp.add_argument('baseline')
+    cmp.add_argument('candidate')
+    add_compare_options(cmp)
+    return p, stress_parser
+
+
+def main():
+    parser, stress_parser = build_parser()
+    args = parser.parse_args()
+    if args.command == 'run':
+        results = run_matrix(args, stress_parser)
+        if args.baseline:
+            sys.exit(report_and_exit_code(load_results(args.baseline), results, args))
+    else:
+        sys.exit(report_and_exit_code(load_results(args.baseline), load_results(args.candidate), args))
+
+
+if __name__ == '__main__':
+    main()
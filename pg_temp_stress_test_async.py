@@ -7,28 +7,448 @@ Melhorias:
   ✓ Finalização automática ao fim do tempo definido
   ✓ CSV detalhado com histórico de métricas acumuladas
   ✓ Métricas médias de tempo de criação e drop de tabelas temporárias
+  ✓ Histogramas de latência (estilo HDR) para CREATE / SELECT / DROP com p50, p90, p99, p99.9 e max
+    por intervalo no log e no CSV; --hist-dump grava os histogramas completos em JSON no final
+  ✓ Modo open-loop (--mode open): operações disparadas em taxa fixa (--rate, constante ou poisson)
+    sobre um pool compartilhado; latência medida a partir do horário agendado, com a espera na
+    fila (queue) separada do tempo de serviço (service)
+  ✓ Cenários plugáveis (--scenario ctas=3,copy=1,...): CTAS, COPY, ON COMMIT DROP, tabela reaproveitada
+    com TRUNCATE, prepared statements e tabela com índices; o relatório mostra vazão e latência por cenário
+  ✓ --server-stats: amostragem no servidor, por uma conexão dedicada, do tamanho e das tuplas mortas
+    do catálogo (pg_class, pg_attribute, ...), do churn de pg_class, de locks aguardando (pg_locks) e dos
+    wait events (pg_stat_activity); as amostras entram como colunas extras no CSV
+  ✓ Contadores por worker (Counters, com __slots__) somados pelo monitor; CSV/JSONL gravados por uma
+    thread em lotes, sem I/O de disco no event loop; --jsonl-report + --ts-interval geram uma série
+    temporal por sub-intervalo (ex.: 0.1s) com contadores e percentis
+  ✓ --processes N: N processos, cada um com seu event loop e uma fatia das conexões (e da --rate);
+    contadores e histogramas são agregados via IPC no mesmo log/CSV
 
 Dependências:
   pip install asyncpg
 
 Exemplo de uso:
   python3 pg_temp_stress_test_async.py --host 127.0.0.1 --port 5432 --dbname testdb --user postgres --password 1234 \
-    --max-conns 50 --test-duration 120 --rows-per-table 5000 --create-delay 0.1 --csv-report report.csv
+    --max-conns 50 --test-duration 120 --rows-per-table 5000 --create-delay 0.1 --csv-report report.csv \
+    --hist-dump hist.json
+
+  Open-loop (200 ciclos CREATE/SELECT/DROP por segundo, chegadas Poisson, 50 conexões no pool):
+  python3 pg_temp_stress_test_async.py --host 127.0.0.1 --dbname testdb --user postgres --password 1234 \
+    --mode open --rate 200 --arrival poisson --max-conns 50 --test-duration 120 --csv-report open.csv
+
+  Mistura de cenários (peso 3 para CTAS, 1 para COPY e 1 para ON COMMIT DROP):
+  python3 pg_temp_stress_test_async.py --host 127.0.0.1 --dbname testdb --user postgres --password 1234 \
+    --scenario ctas=3,copy=1,on_commit_drop=1 --select-after-create --csv-report mix.csv
+
+  Com amostras do catálogo / locks / wait events no CSV a cada segundo:
+  python3 pg_temp_stress_test_async.py --host 127.0.0.1 --dbname testdb --user postgres --password 1234 \
+    --max-conns 100 --server-stats --server-interval 1 --csv-report server.csv
+
+  Série temporal em JSONL a cada 100ms:
+  python3 pg_temp_stress_test_async.py --host 127.0.0.1 --dbname testdb --user postgres --password 1234 \
+    --max-conns 50 --jsonl-report ts.jsonl --ts-interval 0.1
+
+  Milhares de conexões (8 processos com 250 conexões cada):
+  python3 pg_temp_stress_test_async.py --host 127.0.0.1 --dbname testdb --user postgres --password 1234 \
+    --max-conns 2000 --processes 8 --ramp-interval 0.01 --test-duration 300 --csv-report big.csv
 """
 
 import argparse
 import asyncio
 import asyncpg
+import multiprocessing
+import queue
 import random
 import time
+import contextlib
 import csv
+import functools
+import hashlib
+import json
 import uuid
 import signal
 import sys
+import threading
 from datetime import datetime, timedelta
 
 STOP_REQUESTED = False
 
+COUNTERS = ('created', 'dropped', 'errors', 'total_create_time_ms', 'total_drop_time_ms', 'scheduled')
+# operações dos cenários, na ordem em que aparecem no log/CSV
+OPS = ('create', 'copy', 'insert', 'index', 'select', 'commit', 'truncate', 'drop')
+# operações que contam em created / dropped
+CREATE_OPS = ('create',)
+DROP_OPS = ('drop', 'commit')
+# open-loop: espera por conexão, execução do ciclo e total desde o horário agendado
+OPEN_LOOP = ('queue', 'service', 'total')
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+class LatencyHistogram:
+    """Histograma log-linear (estilo HDR) de latências em microssegundos.
+
+    Cada potência de 2 é dividida em 2**(SUB_BITS-1) faixas, então o erro relativo
+    de qualquer valor reportado é < 1%. Histogramas podem ser somados (merge) e
+    serializados (to_dict / from_dict) para comparar execuções offline.
+    """
+    SUB_BITS = 8
+    SUB = 1 << SUB_BITS
+    HALF = SUB >> 1
+
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @classmethod
+    def _index(cls, v):
+        if v < cls.SUB:
+            return v
+        shift = v.bit_length() - cls.SUB_BITS
+        return shift * cls.HALF + (v >> shift)
+
+    @classmethod
+    def _highest(cls, idx):
+        """Maior valor que cai na faixa idx."""
+        if idx < cls.SUB:
+            return idx
+        shift = idx // cls.HALF - 1
+        top = idx - shift * cls.HALF
+        return ((top + 1) << shift) - 1
+
+    def record(self, us):
+        us = int(us)
+        idx = self._index(us)
+        counts = self.counts
+        if idx >= len(counts):
+            counts.extend([0] * (idx + 1 - len(counts)))
+        counts[idx] += 1
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+        if self.min is None or us < self.min:
+            self.min = us
+
+    def record_seconds(self, secs):
+        self.record(secs * 1_000_000)
+
+    def merge(self, other):
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        return self
+
+    def reset(self):
+        self.__init__()
+
+    def percentile(self, pct):
+        """Valor (us) abaixo do qual estão pct% das amostras (0 se vazio)."""
+        if self.count == 0:
+            return 0
+        target = max(1, -(-self.count * pct // 100))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return min(self._highest(i), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self):
+        return {
+            'sub_bits': self.SUB_BITS,
+            'count': self.count,
+            'total_us': self.total,
+            'min_us': self.min,
+            'max_us': self.max,
+            'counts': {i: c for i, c in enumerate(self.counts) if c},
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        h = cls()
+        if d['counts']:
+            h.counts = [0] * (max(int(i) for i in d['counts']) + 1)
+            for i, c in d['counts'].items():
+                h.counts[int(i)] = c
+        h.count = d['count']
+        h.total = d['total_us']
+        h.min = d['min_us']
+        h.max = d['max_us']
+        return h
+
+
+# processos filhos mandam contadores + histogramas do intervalo com esta frequência (s)
+PROCESS_REPORT_INTERVAL = 0.5
+
+
+def process_report_interval(args):
+    # com --ts-interval curto, quatro envios por intervalo: com um só, a fase entre o envio do filho
+    # e o fechamento do intervalo no pai alterna intervalos vazios e rajadas
+    return min(PROCESS_REPORT_INTERVAL, args.ts_interval / 4) if args.ts_interval else PROCESS_REPORT_INTERVAL
+
+
+def new_histograms():
+    # criados sob demanda por record(): 'cenario.op', 'cenario.cycle' e os do OPEN_LOOP
+    return {}
+
+
+def record(stats, key, secs):
+    # o monitor troca stats['interval'] a cada log: sempre gravar via stats['interval']
+    h = stats['interval'].get(key)
+    if h is None:
+        h = stats['interval'][key] = LatencyHistogram()
+    h.record_seconds(secs)
+
+
+def merge_histograms(dst, src):
+    for key, h in src.items():
+        if key in dst:
+            dst[key].merge(h)
+        else:
+            dst[key] = LatencyHistogram().merge(h)
+
+
+class Counters:
+    """Contadores de um worker: cada worker grava só nos seus, o monitor soma (refresh_counters)."""
+    __slots__ = COUNTERS + ('cycles',)
+
+    def __init__(self):
+        for k in COUNTERS:
+            setattr(self, k, 0)
+        self.total_create_time_ms = 0.0
+        self.total_drop_time_ms = 0.0
+        self.cycles = {}  # ciclos concluídos por cenário
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in COUNTERS}
+
+    def load(self, counters, cycles):
+        for k in COUNTERS:
+            setattr(self, k, counters[k])
+        self.cycles = cycles
+
+
+def worker_counters(stats):
+    c = Counters()
+    stats['counters'].append(c)
+    return c
+
+
+def refresh_counters(stats):
+    """Soma os contadores dos workers em stats[...] (created, errors, cycles, ...)."""
+    counters = stats['counters']
+    for k in COUNTERS:
+        stats[k] = sum(getattr(c, k) for c in counters)
+    cycles = {}
+    for c in counters:
+        for name, n in c.cycles.items():
+            cycles[name] = cycles.get(name, 0) + n
+    stats['cycles'] = cycles
+
+
+def close_interval(stats):
+    """Fecha o intervalo: workers passam a gravar em histogramas novos; o fechado vai para o acumulado
+    (stats['hist']) e para a janela do próximo log (stats['window'])."""
+    interval, stats['interval'] = stats['interval'], new_histograms()
+    merge_histograms(stats['hist'], interval)
+    merge_histograms(stats['window'], interval)
+    return interval
+
+
+def new_stats():
+    stats = {k: 0 for k in COUNTERS}
+    stats['total_create_time_ms'] = 0.0
+    stats['total_drop_time_ms'] = 0.0
+    stats['counters'] = []  # um Counters por worker; stats[k] é a soma feita por refresh_counters
+    stats['cycles'] = {}  # ciclos concluídos por cenário
+    stats['server'] = None  # última amostra do server_sampler
+    stats['server_peak_lock_waits'] = 0
+    # latências do intervalo atual (workers gravam aqui), desde o último log e acumuladas
+    stats['interval'] = new_histograms()
+    stats['window'] = new_histograms()
+    stats['hist'] = new_histograms()
+    return stats
+
+
+class ReportWriter(threading.Thread):
+    """Grava as linhas de CSV / JSONL numa thread, em lotes, fora do event loop.
+
+    O event loop só enfileira (put é O(1) e não bloqueia); a serialização, o write e
+    o flush acontecem aqui, uma vez por lote.
+    """
+
+    def __init__(self, csv_path=None, jsonl_path=None, batch=512, flush_interval=0.5):
+        super().__init__(name='report-writer', daemon=True)
+        self.q = queue.SimpleQueue()
+        self.batch = batch
+        self.flush_interval = flush_interval
+        self.csv_file = open(csv_path, 'w', newline='') if csv_path else None
+        self.csv_writer = csv.writer(self.csv_file) if self.csv_file else None
+        self.jsonl_file = open(jsonl_path, 'w') if jsonl_path else None
+
+    def csv(self, row):
+        if self.csv_writer:
+            self.q.put(('csv', row))
+
+    def jsonl(self, record):
+        if self.jsonl_file:
+            self.q.put(('jsonl', record))
+
+    def run(self):
+        done = False
+        while not done:
+            try:
+                items = [self.q.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(items) < self.batch:
+                try:
+                    items.append(self.q.get_nowait())
+                except queue.Empty:
+                    break
+            for item in items:
+                if item is None:
+                    done = True
+                elif item[0] == 'csv':
+                    self.csv_writer.writerow(item[1])
+                else:
+                    self.jsonl_file.write(json.dumps(item[1]) + '\n')
+            for f in (self.csv_file, self.jsonl_file):
+                if f:
+                    f.flush()
+
+    def close(self):
+        self.q.put(None)
+        self.join()
+        for f in (self.csv_file, self.jsonl_file):
+            if f:
+                f.close()
+
+
+def report_keys(args):
+    """Linhas do relatório: operações (somando os cenários), open-loop e um ciclo por cenário."""
+    ops = [op for op in OPS if any(op in SCENARIOS[name].ops for name in args.scenario_weights)]
+    cycles = [f"{name}_cycle" for name in args.scenario_weights]
+    return tuple(ops) + (OPEN_LOOP if args.mode == 'open' else ()) + tuple(cycles)
+
+
+def report_view(hists, keys):
+    """Agrupa os histogramas brutos ('cenario.op') nas linhas de report_keys."""
+    view = {key: LatencyHistogram() for key in keys}
+    for raw_key, h in hists.items():
+        scenario, _, op = raw_key.rpartition('.')
+        key = f"{scenario}_cycle" if op == 'cycle' else op
+        if key in view:
+            view[key].merge(h)
+    return view
+
+
+def percentile_summary(h):
+    """[p50, p90, p99, p99.9, max] em ms."""
+    return [h.percentile(p) / 1000.0 for p in PERCENTILES] + [h.max / 1000.0]
+
+
+def percentile_cells(pcts):
+    """Células do CSV para um percentile_summary; None (intervalo sem amostras) fica vazio."""
+    if pcts is None:
+        return [''] * (len(PERCENTILES) + 1)
+    return [f"{v:.2f}" for v in pcts]
+
+
+def percentile_columns(keys):
+    return [f'{op}_{name}_ms' for op in keys for name in ('p50', 'p90', 'p99', 'p999', 'max')]
+
+# tabelas de catálogo que mais sofrem com CREATE/DROP de tabelas temporárias
+CATALOG_TABLES = ('pg_class', 'pg_attribute', 'pg_type', 'pg_depend')
+WAIT_TYPES = ('Lock', 'LWLock', 'IO', 'IPC', 'BufferPin')
+
+SERVER_SQL = """
+SELECT
+  (SELECT sum(pg_total_relation_size(c.oid))::bigint
+     FROM pg_class c
+    WHERE c.relnamespace = 'pg_catalog'::regnamespace AND c.relkind = 'r') AS catalog_bytes,
+  (SELECT sum(n_dead_tup)::bigint FROM pg_stat_sys_tables WHERE schemaname = 'pg_catalog') AS catalog_dead_tup,
+  (SELECT json_object_agg(relname, json_build_object(
+            'bytes', pg_total_relation_size(relid), 'dead', n_dead_tup,
+            'ins', n_tup_ins, 'del', n_tup_del))
+     FROM pg_stat_sys_tables
+    WHERE schemaname = 'pg_catalog' AND relname = ANY($1::text[])) AS tables,
+  (SELECT count(*) FROM pg_locks WHERE NOT granted) AS lock_waits,
+  (SELECT json_object_agg(w, n) FROM (
+      SELECT wait_event_type || ':' || wait_event AS w, count(*) AS n
+        FROM pg_stat_activity
+       WHERE wait_event IS NOT NULL AND state = 'active' AND pid <> pg_backend_pid()
+       GROUP BY 1) e) AS waits
+"""
+
+
+def server_columns():
+    cols = ['srv_catalog_bytes', 'srv_catalog_dead_tup']
+    for t in CATALOG_TABLES:
+        cols += [f'srv_{t}_bytes', f'srv_{t}_dead_tup']
+    cols += ['srv_pg_class_ins', 'srv_pg_class_del', 'srv_lock_waits']
+    cols += [f'srv_wait_{w.lower()}' for w in WAIT_TYPES]
+    cols.append('srv_top_waits')
+    return cols
+
+
+def server_values(sample):
+    if sample is None:
+        return [''] * len(server_columns())
+    tables = sample['tables']
+    vals = [sample['catalog_bytes'], sample['catalog_dead_tup']]
+    for t in CATALOG_TABLES:
+        vals += [tables.get(t, {}).get('bytes', ''), tables.get(t, {}).get('dead', '')]
+    pg_class = tables.get('pg_class', {})
+    vals += [pg_class.get('ins', ''), pg_class.get('del', ''), sample['lock_waits']]
+    by_type = {}
+    for ev, n in sample['waits'].items():
+        wtype = ev.split(':', 1)[0]
+        by_type[wtype] = by_type.get(wtype, 0) + n
+    vals += [by_type.get(w, 0) for w in WAIT_TYPES]
+    top = sorted(sample['waits'].items(), key=lambda kv: -kv[1])[:5]
+    vals.append(';'.join(f"{ev}={n}" for ev, n in top))
+    return vals
+
+
+async def server_sampler(conn_info, interval, stats, end):
+    """Amostra catálogo / locks / wait events numa conexão dedicada; guarda a última em stats['server']."""
+    try:
+        conn = await asyncpg.connect(**conn_info, server_settings={'application_name': 'pg_temp_stress_sampler'})
+    except Exception as e:
+        print(f"[sampler] connect error: {e}", file=sys.stderr)
+        return
+    try:
+        while datetime.now() < end and not STOP_REQUESTED:
+            try:
+                row = await conn.fetchrow(SERVER_SQL, list(CATALOG_TABLES))
+                sample = dict(row)
+                sample['tables'] = json.loads(row['tables']) if row['tables'] else {}
+                sample['waits'] = json.loads(row['waits']) if row['waits'] else {}
+                stats['server'] = sample
+                # o pior momento do intervalo importa mais que o último: mantém o pico de lock_waits
+                stats['server_peak_lock_waits'] = max(stats['server_peak_lock_waits'], sample['lock_waits'])
+            except Exception as e:
+                print(f"[sampler] error: {e}", file=sys.stderr)
+            await asyncio.sleep(interval)
+    finally:
+        await conn.close()
+
+
 def handle_signal(sig, frame):
     global STOP_REQUESTED
     STOP_REQUESTED = True
@@ -37,37 +457,256 @@ def handle_signal(sig, frame):
 signal.signal(signal.SIGINT, handle_signal)
 signal.signal(signal.SIGTERM, handle_signal)
 
-async def async_worker(conn_info, worker_id, rows_per_table, mean_delay, do_select, stats):
+class Scenario:
+    __slots__ = ('name', 'fn', 'ops', 'help', 'setup')
+
+    def __init__(self, name, fn, ops, help, setup=None):
+        self.name = name
+        self.fn = fn
+        self.ops = ops
+        self.help = help
+        self.setup = setup
+
+
+SCENARIOS = {}
+
+
+def scenario(name, ops, help='', setup=None):
+    """Registra um cenário: async fn(cycle) que executa um ciclo usando cycle.timed(op, ...).
+
+    `setup` (async fn(conn), opcional) roda uma vez por conexão, ao abrir; o que ele prepara
+    fica em conn.session.
+    """
+    def register(fn):
+        SCENARIOS[name] = Scenario(name, fn, ops, help, setup)
+        return fn
+    return register
+
+
+class SessionConnection(asyncpg.Connection):
+    """Conexão com estado da sessão (tabelas reaproveitadas, statements preparados) em `session`.
+
+    O estado nasce e morre com a conexão: uma conexão nova (inclusive a que substitui uma que
+    caiu) passa pelo setup_session antes do primeiro ciclo.
+    """
+    __slots__ = ('session',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = {}
+
+
+async def setup_session(conn, args):
+    for name in args.scenario_weights:
+        if SCENARIOS[name].setup is not None:
+            await SCENARIOS[name].setup(conn)
+
+
+async def session_connect(conn_info, args):
+    conn = await asyncpg.connect(**conn_info, connection_class=SessionConnection)
+    try:
+        await setup_session(conn, args)
+    except BaseException:
+        await conn.close()
+        raise
+    return conn
+
+
+class SessionPool:
+    """Conexões abertas antes do teste e emprestadas direto, sem o proxy do asyncpg.Pool.
+
+    O asyncpg.Pool invalida os PreparedStatement a cada release; aqui a conexão (e o que o
+    setup_session preparou nela) continua a mesma entre um ciclo e outro. Uma conexão que
+    caiu é trocada por outra no próximo acquire.
+    """
+
+    def __init__(self, conn_info, args, size):
+        self.conn_info = conn_info
+        self.args = args
+        self.size = size
+        self.free = asyncio.Queue()
+
+    async def start(self):
+        for conn in await asyncio.gather(*(session_connect(self.conn_info, self.args) for _ in range(self.size))):
+            self.free.put_nowait(conn)
+        return self
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        conn = await self.free.get()
+        try:
+            if conn.is_closed():
+                conn = await session_connect(self.conn_info, self.args)
+            yield conn
+        finally:
+            self.free.put_nowait(conn)
+
+    async def close(self):
+        while not self.free.empty():
+            conn = self.free.get_nowait()
+            try:
+                await conn.close(timeout=5)
+            except Exception:
+                conn.terminate()
+
+
+def parse_scenarios(spec):
+    """'ctas=3,copy=1' -> {'ctas': 3.0, 'copy': 1.0} (peso padrão 1)."""
+    weights = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, weight = item.partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r} (available: {', '.join(SCENARIOS)})")
+        try:
+            weights[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid weight for {name!r}: {weight!r}")
+        if weights[name] <= 0:
+            raise argparse.ArgumentTypeError(f"weight for {name!r} must be > 0")
+    if not weights:
+        raise argparse.ArgumentTypeError('no scenario selected')
+    return weights
+
+
+class Cycle:
+    """Um ciclo de um cenário: conexão, tabela temporária e gravação das latências."""
+    __slots__ = ('conn', 'tbl', 'rows', 'do_select', 'stats', 'counters', 'scenario')
+
+    def __init__(self, conn, tbl, rows, do_select, stats, counters, scenario):
+        self.conn = conn
+        self.tbl = tbl
+        self.rows = rows
+        self.do_select = do_select
+        self.stats = stats
+        self.counters = counters
+        self.scenario = scenario
+
+    async def timed(self, op, awaitable):
+        t0 = time.perf_counter()
+        result = await awaitable
+        secs = time.perf_counter() - t0
+        record(self.stats, f"{self.scenario}.{op}", secs)
+        c = self.counters
+        if op in CREATE_OPS:
+            c.created += 1
+            c.total_create_time_ms += secs * 1000
+        elif op in DROP_OPS:
+            c.dropped += 1
+            c.total_drop_time_ms += secs * 1000
+        return result
+
+
+@functools.lru_cache(maxsize=8)
+def copy_records(rows):
+    """Linhas do COPY geradas uma vez por processo (mesmo conteúdo do generate_series)."""
+    return [(i, hashlib.md5(str(i).encode()).hexdigest()) for i in range(1, rows + 1)]
+
+
+@scenario('ctas', ('create', 'select', 'drop'), 'CREATE TEMP TABLE ... AS SELECT generate_series, DROP')
+async def scenario_ctas(c):
+    await c.timed('create', c.conn.execute(f"CREATE TEMP TABLE {c.tbl} AS SELECT i AS n, md5(i::text) AS v FROM generate_series(1, $1) i", c.rows))
+    if c.do_select:
+        await c.timed('select', c.conn.fetchval(f"SELECT count(*) FROM {c.tbl}"))
+    await c.timed('drop', c.conn.execute(f"DROP TABLE IF EXISTS {c.tbl}"))
+
+
+@scenario('copy', ('create', 'copy', 'select', 'drop'), 'CREATE TEMP TABLE vazia + COPY (copy_records_to_table), DROP')
+async def scenario_copy(c):
+    await c.timed('create', c.conn.execute(f"CREATE TEMP TABLE {c.tbl} (n int, v text)"))
+    await c.timed('copy', c.conn.copy_records_to_table(c.tbl, records=copy_records(c.rows), columns=('n', 'v')))
+    if c.do_select:
+        await c.timed('select', c.conn.fetchval(f"SELECT count(*) FROM {c.tbl}"))
+    await c.timed('drop', c.conn.execute(f"DROP TABLE IF EXISTS {c.tbl}"))
+
+
+@scenario('on_commit_drop', ('create', 'select', 'commit'), 'CTAS ... ON COMMIT DROP dentro de uma transação; o DROP acontece no COMMIT')
+async def scenario_on_commit_drop(c):
+    tr = c.conn.transaction()
+    await tr.start()
+    try:
+        await c.timed('create', c.conn.execute(f"CREATE TEMP TABLE {c.tbl} ON COMMIT DROP AS SELECT i AS n, md5(i::text) AS v FROM generate_series(1, $1) i", c.rows))
+        if c.do_select:
+            await c.timed('select', c.conn.fetchval(f"SELECT count(*) FROM {c.tbl}"))
+    except BaseException:
+        await tr.rollback()
+        raise
+    await c.timed('commit', tr.commit())
+
+
+async def setup_truncate(conn):
+    await conn.execute("CREATE TEMP TABLE IF NOT EXISTS tmp_reuse_trunc (n int, v text)")
+
+
+@scenario('truncate', ('insert', 'select', 'truncate'), 'uma tabela temporária por sessão, reaproveitada: INSERT + TRUNCATE (protocolo simples)',
+          setup=setup_truncate)
+async def scenario_truncate(c):
+    await c.timed('insert', c.conn.execute(f"INSERT INTO tmp_reuse_trunc SELECT i, md5(i::text) FROM generate_series(1, {int(c.rows)}) i"))
+    if c.do_select:
+        await c.timed('select', c.conn.execute("SELECT count(*) FROM tmp_reuse_trunc"))
+    await c.timed('truncate', c.conn.execute("TRUNCATE tmp_reuse_trunc"))
+
+
+async def setup_prepared(conn):
+    await conn.execute("CREATE TEMP TABLE IF NOT EXISTS tmp_reuse_prep (n int, v text)")
+    conn.session['prepared'] = {
+        'insert': await conn.prepare("INSERT INTO tmp_reuse_prep SELECT i, md5(i::text) FROM generate_series(1, $1) i"),
+        'select': await conn.prepare("SELECT count(*) FROM tmp_reuse_prep WHERE n <= $1"),
+        'truncate': await conn.prepare("TRUNCATE tmp_reuse_prep"),
+    }
+
+
+@scenario('prepared', ('insert', 'select', 'truncate'), 'como truncate, mas INSERT/SELECT/TRUNCATE preparados (conn.prepare) uma vez por sessão',
+          setup=setup_prepared)
+async def scenario_prepared(c):
+    st = c.conn.session['prepared']
+    await c.timed('insert', st['insert'].fetch(c.rows))
+    if c.do_select:
+        await c.timed('select', st['select'].fetchval(c.rows))
+    await c.timed('truncate', st['truncate'].fetch())
+
+
+@scenario('indexed', ('create', 'index', 'select', 'drop'), 'CTAS + dois índices (n, v), DROP')
+async def scenario_indexed(c):
+    await c.timed('create', c.conn.execute(f"CREATE TEMP TABLE {c.tbl} AS SELECT i AS n, md5(i::text) AS v FROM generate_series(1, $1) i", c.rows))
+    await c.timed('index', c.conn.execute(f"CREATE INDEX ON {c.tbl} (n); CREATE INDEX ON {c.tbl} (v)"))
+    if c.do_select:
+        await c.timed('select', c.conn.fetchval(f"SELECT count(*) FROM {c.tbl} WHERE n = $1", c.rows // 2))
+    await c.timed('drop', c.conn.execute(f"DROP TABLE IF EXISTS {c.tbl}"))
+
+
+def pick_scenario(weights):
+    names = list(weights)
+    return random.choices(names, weights=[weights[n] for n in names])[0]
+
+
+async def run_cycle(conn, tbl, args, stats, counters):
+    """Executa um ciclo de um cenário sorteado pelos pesos de --scenario."""
+    name = pick_scenario(args.scenario_weights)
+    t0 = time.perf_counter()
+    await SCENARIOS[name].fn(Cycle(conn, tbl, args.rows_per_table, args.select_after_create, stats, counters, name))
+    record(stats, f"{name}.cycle", time.perf_counter() - t0)
+    counters.cycles[name] = counters.cycles.get(name, 0) + 1
+
+async def async_worker(conn_info, worker_id, args, stats):
     global STOP_REQUESTED
+    conn = None
+    counters = worker_counters(stats)
     try:
-        conn = await asyncpg.connect(**conn_info)
+        conn = await session_connect(conn_info, args)
         while not STOP_REQUESTED:
             tbl = f"tmp_{worker_id}_{uuid.uuid4().hex[:8]}"
             try:
-                # medir tempo de criação
-                t0 = time.perf_counter()
-                await conn.execute(f"CREATE TEMP TABLE {tbl} AS SELECT i AS n, md5(i::text) AS v FROM generate_series(1, $1) i", rows_per_table)
-                create_time = (time.perf_counter() - t0) * 1000
-                stats['created'] += 1
-                stats['total_create_time_ms'] += create_time
-
-                if do_select:
-                    await conn.fetchval(f"SELECT count(*) FROM {tbl}")
-
-                # medir tempo de drop
-                t1 = time.perf_counter()
-                await conn.execute(f"DROP TABLE IF EXISTS {tbl}")
-                drop_time = (time.perf_counter() - t1) * 1000
-                stats['dropped'] += 1
-                stats['total_drop_time_ms'] += drop_time
-
+                await run_cycle(conn, tbl, args, stats, counters)
             except Exception as e:
-                stats['errors'] += 1
+                counters.errors += 1
                 print(f"[worker {worker_id}] error: {e}", file=sys.stderr)
 
-            await asyncio.sleep(random.expovariate(1.0 / max(mean_delay, 0.001)))
+            await asyncio.sleep(random.expovariate(1.0 / max(args.create_delay, 0.001)))
     except Exception as e:
-        stats['errors'] += 1
+        counters.errors += 1
         print(f"[worker {worker_id}] connection error: {e}", file=sys.stderr)
     finally:
         try:
@@ -75,51 +714,283 @@ async def async_worker(conn_info, worker_id, rows_per_table, mean_delay, do_sele
         except Exception:
             pass
 
+async def open_loop_op(pool, op_id, scheduled, args, stats, counters):
+    """Executa um ciclo agendado para `scheduled` (perf_counter) usando uma conexão do pool."""
+    try:
+        async with pool.acquire() as conn:
+            started = time.perf_counter()
+            record(stats, 'queue', started - scheduled)
+            await run_cycle(conn, f"tmp_{op_id}_{uuid.uuid4().hex[:8]}", args, stats, counters)
+            done = time.perf_counter()
+            record(stats, 'service', done - started)
+            record(stats, 'total', done - scheduled)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        counters.errors += 1
+        print(f"[op {op_id}] error: {e}", file=sys.stderr)
+
+async def open_loop_scheduler(pool, args, stats, deadline):
+    """Dispara ciclos na taxa alvo sem esperar os anteriores terminarem (open-loop).
+
+    Os horários seguem o agendamento mesmo quando o servidor fica lento, então
+    atrasos aparecem como latência (sem coordinated omission). --max-inflight só
+    protege o cliente: a espera nele também conta, pois a latência parte do agendado.
+    """
+    global STOP_REQUESTED
+    inflight = set()
+    counters = worker_counters(stats)  # as operações do scheduler rodam no mesmo event loop
+    slots = asyncio.Semaphore(args.max_inflight)
+    next_t = time.perf_counter()
+    n = 0
+    while not STOP_REQUESTED and next_t < deadline:
+        if args.arrival == 'poisson':
+            next_t += random.expovariate(args.rate)
+        else:
+            next_t += 1.0 / args.rate
+        delay = next_t - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await slots.acquire()
+        n += 1
+        counters.scheduled += 1
+        task = asyncio.create_task(open_loop_op(pool, f"o{n}", next_t, args, stats, counters))
+        inflight.add(task)
+        task.add_done_callback(lambda t: (inflight.discard(t), slots.release()))
+    return inflight
+
+async def start_load(args, conn_info, stats, end):
+    """Inicia a carga (closed: um worker por conexão; open: scheduler + pool).
+
+    Devolve (tasks, pool) para stop_load. No modo open só retorna no fim do teste.
+    """
+    workers = []
+    pool = None
+    if args.mode == 'open':
+        # conexões abertas antes de começar, para não medir o connect
+        pool = await SessionPool(conn_info, args, args.max_conns).start()
+        deadline = time.perf_counter() + (end - datetime.now()).total_seconds()
+        workers = list(await open_loop_scheduler(pool, args, stats, deadline))
+    else:
+        for i in range(args.max_conns):
+            if STOP_REQUESTED:
+                break
+            task = asyncio.create_task(async_worker(conn_info, f"{args.worker_prefix}{i+1}", args, stats))
+            workers.append(task)
+            await asyncio.sleep(args.ramp_interval)
+    return workers, pool
+
+async def stop_load(workers, pool):
+    # Cancelar tarefas e aguardar encerramento
+    for w in workers:
+        w.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    if pool is not None:
+        await pool.close()
+
+def process_main(args, idx, out_q, stop_event):
+    """Entrada de cada processo filho do --processes."""
+    # quem trata Ctrl+C é o pai, que avisa os filhos pelo stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(process_run(args, idx, out_q, stop_event))
+
+async def process_run(args, idx, out_q, stop_event):
+    global STOP_REQUESTED
+    conn_info = dict(user=args.user, password=args.password, database=args.dbname, host=args.host, port=args.port)
+    stats = new_stats()
+    end = datetime.now() + timedelta(seconds=args.test_duration)
+
+    def flush():
+        interval, stats['interval'] = stats['interval'], new_histograms()
+        refresh_counters(stats)
+        out_q.put(('stats', idx, {k: stats[k] for k in COUNTERS}, stats['cycles'],
+                   {key: h.to_dict() for key, h in interval.items() if h.count}))
+
+    report_interval = process_report_interval(args)
+
+    async def reporter():
+        global STOP_REQUESTED
+        while not STOP_REQUESTED:
+            await asyncio.sleep(report_interval)
+            if stop_event.is_set():
+                STOP_REQUESTED = True
+            flush()
+
+    reporter_task = asyncio.create_task(reporter())
+    try:
+        workers, pool = await start_load(args, conn_info, stats, end)
+        while datetime.now() < end and not STOP_REQUESTED:
+            await asyncio.sleep(0.2)
+            if stop_event.is_set():
+                break
+        STOP_REQUESTED = True
+        await stop_load(workers, pool)
+    finally:
+        STOP_REQUESTED = True
+        await reporter_task
+        flush()
+        out_q.put(('done', idx))
+
+class LoadProcesses:
+    """Divide a carga entre N processos e agrega os resultados em `stats` do pai."""
+
+    def __init__(self, args, stats):
+        self.stats = stats
+        n = max(1, min(args.processes, args.max_conns))
+        ctx = multiprocessing.get_context('spawn')
+        self.out_q = ctx.Queue()
+        self.stop_event = ctx.Event()
+        self.latest = {}
+        self.done = set()
+        self.poll = min(0.05, process_report_interval(args) / 2)
+        self.procs = []
+        for i in range(n):
+            child = argparse.Namespace(**vars(args))
+            child.max_conns = args.max_conns // n + (1 if i < args.max_conns % n else 0)
+            child.rate = args.rate / n
+            child.max_inflight = max(1, args.max_inflight // n)
+            child.worker_prefix = f"p{i+1}w"
+            self.procs.append(ctx.Process(target=process_main, args=(child, i, self.out_q, self.stop_event), daemon=True))
+
+    def start(self):
+        for proc in self.procs:
+            proc.start()
+
+    def _handle(self, msg):
+        if msg[0] == 'done':
+            self.done.add(msg[1])
+            return
+        _, idx, counters, cycles, hists = msg
+        # um Counters por filho, com os totais mais recentes dele
+        if idx not in self.latest:
+            self.latest[idx] = worker_counters(self.stats)
+        self.latest[idx].load(counters, cycles)
+        merge_histograms(self.stats['interval'], {key: LatencyHistogram.from_dict(d) for key, d in hists.items()})
+
+    async def collect(self):
+        """Lê a fila dos filhos até todos terminarem."""
+        while len(self.done) < len(self.procs):
+            try:
+                msg = self.out_q.get_nowait()
+            except queue.Empty:
+                if STOP_REQUESTED:
+                    self.stop_event.set()
+                if not any(p.is_alive() for p in self.procs) and self.out_q.empty():
+                    break
+                await asyncio.sleep(self.poll)
+                continue
+            self._handle(msg)
+
+    async def stop(self, collector):
+        self.stop_event.set()
+        await collector
+        for proc in self.procs:
+            await asyncio.get_running_loop().run_in_executor(None, proc.join, 10)
+            if proc.is_alive():
+                proc.terminate()
+
 async def run_async(args):
     global STOP_REQUESTED
     conn_info = dict(user=args.user, password=args.password, database=args.dbname, host=args.host, port=args.port)
-    stats = {
-        'created': 0,
-        'dropped': 0,
-        'errors': 0,
-        'total_create_time_ms': 0.0,
-        'total_drop_time_ms': 0.0
-    }
+    stats = new_stats()
 
-    csv_file = open(args.csv_report, 'w', newline='') if args.csv_report else None
-    csv_writer = None
-    if csv_file:
-        csv_writer = csv.writer(csv_file)
-        csv_writer.writerow(['timestamp', 'elapsed_s', 'created', 'dropped', 'errors', 'avg_create_ms', 'avg_drop_ms'])
+    keys = report_keys(args)
+    open_loop = args.mode == 'open'
+
+    writer = None
+    if args.csv_report or args.jsonl_report:
+        writer = ReportWriter(args.csv_report, args.jsonl_report)
+        writer.start()
+        writer.csv(['timestamp', 'elapsed_s', 'created', 'dropped', 'errors', 'avg_create_ms', 'avg_drop_ms']
+                   + (['scheduled'] if open_loop else []) + percentile_columns(keys)
+                   + [f"{name}_cycles" for name in args.scenario_weights]
+                   + (server_columns() + ['srv_peak_lock_waits'] if args.server_stats else []))
 
     start = datetime.now()
     end = start + timedelta(seconds=args.test_duration)
+    t_start = time.perf_counter()
+
+    def averages():
+        avg_create = (stats['total_create_time_ms'] / stats['created']) if stats['created'] > 0 else 0
+        avg_drop = (stats['total_drop_time_ms'] / stats['dropped']) if stats['dropped'] > 0 else 0
+        return avg_create, avg_drop
+
+    def csv_row(elapsed, pcts, srv, peak_lock_waits):
+        avg_create, avg_drop = averages()
+        return ([datetime.now().isoformat(), f"{elapsed:.1f}", stats['created'], stats['dropped'], stats['errors'], f"{avg_create:.2f}", f"{avg_drop:.2f}"]
+                + ([stats['scheduled']] if open_loop else [])
+                + [cell for key in keys for cell in percentile_cells(pcts[key])]
+                + [stats['cycles'].get(name, 0) for name in args.scenario_weights]
+                + (server_values(srv) + [peak_lock_waits] if args.server_stats else []))
+
+    def ts_record(kind, elapsed, view):
+        return {
+            'kind': kind,
+            'ts': datetime.now().isoformat(),
+            'elapsed_s': round(elapsed, 3),
+            **{k: stats[k] for k in COUNTERS},
+            'cycles': dict(stats['cycles']),
+            'latency_ms': {key: dict(zip(('n', 'p50', 'p90', 'p99', 'p999', 'max'), (h.count,) + tuple(round(v, 3) for v in percentile_summary(h))))
+                           for key, h in view.items() if h.count},
+        }
+
+    async def timeseries():
+        # fecha o intervalo a cada --ts-interval; o monitor continua vendo a janela desde o último log
+        next_t = t_start
+        while datetime.now() < end and not STOP_REQUESTED:
+            next_t += args.ts_interval
+            await asyncio.sleep(max(0.0, next_t - time.perf_counter()))
+            refresh_counters(stats)
+            interval = close_interval(stats)
+            writer.jsonl(ts_record('ts', time.perf_counter() - t_start, report_view(interval, keys)))
 
     async def monitor():
         while datetime.now() < end and not STOP_REQUESTED:
             await asyncio.sleep(args.log_interval)
             elapsed = (datetime.now() - start).total_seconds()
 
-            avg_create = (stats['total_create_time_ms'] / stats['created']) if stats['created'] > 0 else 0
-            avg_drop = (stats['total_drop_time_ms'] / stats['dropped']) if stats['dropped'] > 0 else 0
+            refresh_counters(stats)
+            avg_create, avg_drop = averages()
+            close_interval(stats)
+            window, stats['window'] = stats['window'], new_histograms()
+            view = report_view(window, keys)
+            pcts = {key: percentile_summary(h) for key, h in view.items()}
 
             msg = (f"[{datetime.now().isoformat()}] created={stats['created']} dropped={stats['dropped']} "
                    f"errors={stats['errors']} avg_create={avg_create:.2f}ms avg_drop={avg_drop:.2f}ms elapsed={elapsed:.1f}s")
+            if open_loop:
+                msg += f" scheduled={stats['scheduled']}"
             print(msg)
+            print("    " + " | ".join(
+                f"{key} p50={p[0]:.2f} p90={p[1]:.2f} p99={p[2]:.2f} p99.9={p[3]:.2f} max={p[4]:.2f}ms"
+                for key, p in pcts.items() if view[key].count and not key.endswith('_cycle')))
+            if len(args.scenario_weights) > 1:
+                print("    " + " | ".join(
+                    f"{name} {view[name + '_cycle'].count / max(args.log_interval, 0.001):.1f}/s p50={pcts[name + '_cycle'][0]:.2f} p90={pcts[name + '_cycle'][1]:.2f} p99={pcts[name + '_cycle'][2]:.2f}ms"
+                    for name in args.scenario_weights))
+            srv = stats['server']
+            if srv is not None:
+                print(f"    server: catalog={srv['catalog_bytes'] / 1048576:.1f}MB dead_tup={srv['catalog_dead_tup']} "
+                      f"pg_attribute={srv['tables'].get('pg_attribute', {}).get('bytes', 0) / 1048576:.1f}MB "
+                      f"lock_waits={srv['lock_waits']} (peak {stats['server_peak_lock_waits']}) "
+                      + ' '.join(f"{ev}={n}" for ev, n in sorted(srv['waits'].items(), key=lambda kv: -kv[1])[:3]))
+            peak_lock_waits, stats['server_peak_lock_waits'] = stats['server_peak_lock_waits'], 0
 
-            if csv_writer:
-                csv_writer.writerow([datetime.now().isoformat(), f"{elapsed:.1f}", stats['created'], stats['dropped'], stats['errors'], f"{avg_create:.2f}", f"{avg_drop:.2f}"])
-                csv_file.flush()
+            if writer:
+                writer.csv(csv_row(elapsed, pcts, srv, peak_lock_waits))
+                if not args.ts_interval:
+                    writer.jsonl(ts_record('interval', elapsed, view))
 
     monitor_task = asyncio.create_task(monitor())
+    sampler_task = asyncio.create_task(server_sampler(conn_info, args.server_interval or args.log_interval, stats, end)) if args.server_stats else None
+    ts_task = asyncio.create_task(timeseries()) if args.ts_interval and writer else None
 
-    workers = []
-    for i in range(args.max_conns):
-        if STOP_REQUESTED:
-            break
-        task = asyncio.create_task(async_worker(conn_info, f"w{i+1}", args.rows_per_table, args.create_delay, args.select_after_create, stats))
-        workers.append(task)
-        await asyncio.sleep(args.ramp_interval)
+    if args.processes > 1:
+        procs = LoadProcesses(args, stats)
+        procs.start()
+        collector = asyncio.create_task(procs.collect())
+    else:
+        workers, pool = await start_load(args, conn_info, stats, end)
 
     # Esperar até o tempo de teste acabar
     while datetime.now() < end and not STOP_REQUESTED:
@@ -128,29 +999,79 @@ async def run_async(args):
     STOP_REQUESTED = True
     print("Finalizando workers...")
 
-    # Cancelar tarefas e aguardar encerramento
-    for w in workers:
-        w.cancel()
-    await asyncio.gather(*workers, return_exceptions=True)
+    if args.processes > 1:
+        await procs.stop(collector)
+    else:
+        await stop_load(workers, pool)
 
     await monitor_task
+    if sampler_task:
+        await sampler_task
+    if ts_task:
+        await ts_task
 
-    avg_create = (stats['total_create_time_ms'] / stats['created']) if stats['created'] > 0 else 0
-    avg_drop = (stats['total_drop_time_ms'] / stats['dropped']) if stats['dropped'] > 0 else 0
+    # o que sobrou do último intervalo entra no acumulado (e na janela, que vira a última linha do CSV)
+    refresh_counters(stats)
+    close_interval(stats)
+    last_view = report_view(stats['window'], keys)
+    total_view = report_view(stats['hist'], keys)
+    total_pcts = {key: percentile_summary(h) for key, h in total_view.items()}
+    avg_create, avg_drop = averages()
+    elapsed = (datetime.now() - start).total_seconds()
 
     print("\nFinal stats:")
     print(f"created={stats['created']} dropped={stats['dropped']} errors={stats['errors']}")
     print(f"avg_create={avg_create:.2f}ms avg_drop={avg_drop:.2f}ms")
+    if open_loop:
+        print(f"scheduled={stats['scheduled']} target_rate={args.rate:.1f}/s achieved_rate={stats['dropped'] / max(elapsed, 0.001):.1f}/s")
+    for key in keys:
+        if total_view[key].count and not key.endswith('_cycle'):
+            p = total_pcts[key]
+            print(f"{key}: n={total_view[key].count} p50={p[0]:.2f}ms p90={p[1]:.2f}ms p99={p[2]:.2f}ms p99.9={p[3]:.2f}ms max={p[4]:.2f}ms")
+    print("\nPer scenario:")
+    for name in args.scenario_weights:
+        p = total_pcts[f"{name}_cycle"]
+        print(f"{name}: cycles={stats['cycles'].get(name, 0)} rate={stats['cycles'].get(name, 0) / max(elapsed, 0.001):.1f}/s "
+              f"cycle p50={p[0]:.2f}ms p99={p[2]:.2f}ms p99.9={p[3]:.2f}ms max={p[4]:.2f}ms")
+        for op in SCENARIOS[name].ops:
+            h = stats['hist'].get(f"{name}.{op}")
+            if h is not None and h.count:
+                print(f"    {op}: n={h.count} p50={h.percentile(50) / 1000:.2f}ms p99={h.percentile(99) / 1000:.2f}ms max={h.max / 1000:.2f}ms")
 
-    if csv_writer:
-        csv_writer.writerow([datetime.now().isoformat(), f"{(datetime.now()-start).total_seconds():.1f}", stats['created'], stats['dropped'], stats['errors'], f"{avg_create:.2f}", f"{avg_drop:.2f}"])
-        csv_file.flush()
-        csv_file.close()
-        print(f"Report saved to {args.csv_report}")
+    if writer:
+        # colunas de percentil são por intervalo: a última linha leva o intervalo parcial final
+        last_pcts = {key: percentile_summary(h) if h.count else None for key, h in last_view.items()}
+        writer.csv(csv_row(elapsed, last_pcts, stats['server'], stats['server_peak_lock_waits']))
+        writer.jsonl(ts_record('final', elapsed, total_view))
+        writer.close()
+        for path in (args.csv_report, args.jsonl_report):
+            if path:
+                print(f"Report saved to {path}")
 
+    if args.summary_json:
+        with open(args.summary_json, 'w') as f:
+            json.dump({
+                'started_at': start.isoformat(),
+                'args': {k: v for k, v in vars(args).items() if k != 'password'},
+                'throughput_per_s': {name: n / max(elapsed, 0.001) for name, n in stats['cycles'].items()},
+                **ts_record('final', elapsed, total_view),
+            }, f, indent=2)
+        print(f"Summary saved to {args.summary_json}")
 
-def parse_args():
-    p = argparse.ArgumentParser(description='Async stress test for Postgres temp tables')
+    if args.hist_dump:
+        with open(args.hist_dump, 'w') as f:
+            json.dump({
+                'started_at': start.isoformat(),
+                'args': {k: v for k, v in vars(args).items() if k != 'password'},
+                'cycles': stats['cycles'],
+                'histograms': {key: h.to_dict() for key, h in sorted(stats['hist'].items())},
+            }, f, indent=2)
+        print(f"Histograms saved to {args.hist_dump}")
+
+
+def build_parser(add_help=True):
+    """Parser das opções do teste; o pg_temp_stress_bench.py reaproveita como parent."""
+    p = argparse.ArgumentParser(description='Async stress test for Postgres temp tables', add_help=add_help)
     p.add_argument('--host', required=True)
     p.add_argument('--port', type=int, default=5432)
     p.add_argument('--dbname', required=True)
@@ -164,7 +1085,29 @@ def parse_args():
     p.add_argument('--select-after-create', action='store_true')
     p.add_argument('--log-interval', type=int, default=5)
     p.add_argument('--csv-report', help='CSV file to write results')
-    return p.parse_args()
+    p.add_argument('--jsonl-report', help='JSONL file with one record per interval (or per --ts-interval) plus a final record')
+    p.add_argument('--ts-interval', type=float, default=None,
+                   help='time-series granularity in seconds for --jsonl-report (e.g. 0.1); default: one record per --log-interval')
+    p.add_argument('--hist-dump', help='JSON file to write the full latency histograms at the end')
+    p.add_argument('--mode', choices=('closed', 'open'), default='closed',
+                   help='closed: each connection loops CREATE/DROP + create-delay; open: fixed arrival rate over a shared pool')
+    p.add_argument('--rate', type=float, default=100.0, help='open mode: target cycles per second')
+    p.add_argument('--arrival', choices=('constant', 'poisson'), default='constant', help='open mode: inter-arrival distribution')
+    p.add_argument('--max-inflight', type=int, default=10000, help='open mode: cap on scheduled-but-unfinished cycles')
+    p.add_argument('--processes', type=int, default=1,
+                   help='worker processes, each with its own event loop and a slice of --max-conns (and --rate)')
+    p.add_argument('--scenario', default='ctas', type=parse_scenarios, dest='scenario_weights',
+                   help='weighted scenario mix, e.g. ctas=3,copy=1 (available: ' + ', '.join(SCENARIOS) + ')')
+    p.add_argument('--server-stats', action='store_true',
+                   help='sample catalog size/dead tuples, lock waits and wait events on a dedicated connection (extra CSV columns)')
+    p.add_argument('--server-interval', type=float, default=None, help='sampling interval for --server-stats (default: --log-interval)')
+    p.add_argument('--summary-json', help='JSON file with the final counters, throughput and latency percentiles')
+    p.set_defaults(worker_prefix='w')
+    return p
+
+
+def parse_args():
+    return build_parser().parse_args()
 
 if __name__ == '__main__':
     args = parse_args()
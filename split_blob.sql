@@ -17,24 +17,26 @@ CREATE TABLE dados (
     identificador UUID DEFAULT gen_random_uuid() -- certifique-se de que a extensão 'pgcrypto' esteja habilitada ou alguma coisa que te agrade
 );
 
+-- Índice para remontar os registros na ordem sem ordenar a tabela inteira
+CREATE INDEX idx_dados_identificador_sequencial ON dados (identificador, sequencial);
+
 -- Função que vai gerar a separação do blob
+-- Todos os pedaços saem de um único INSERT ... SELECT. A regex percorre o texto uma vez só, em trechos
+-- de 250 caracteres (o limite de repetição da regex é 255), e cada 4 trechos viram uma parte de 1000;
+-- o loop com SUBSTRING(dado FROM ...) copiava o restante da string a cada volta (O(n²)).
+-- tamanho_parte precisa ser múltiplo de trecho.
+-- Para blobs muito grandes use o pg_split_blob.py, que quebra o arquivo no cliente e carrega via COPY.
 CREATE OR REPLACE FUNCTION inserir_dados(dado TEXT)
 RETURNS VOID AS $$
 DECLARE
     identificador UUID := gen_random_uuid();
     tamanho_parte INT := 1000;
-    parte TEXT;
-    sequencial INT := 1;
+    trecho INT := 250;
 BEGIN
-    WHILE LENGTH(dado) > 0 LOOP
-        parte := LEFT(dado, tamanho_parte);
-        dado := SUBSTRING(dado FROM tamanho_parte + 1);
-
-        INSERT INTO dados (sequencial, parte, identificador)
-        VALUES (sequencial, parte, identificador);
-
-        sequencial := sequencial + 1;
-    END LOOP;
+    INSERT INTO dados (sequencial, parte, identificador)
+    SELECT (p.n - 1) / (tamanho_parte / trecho) + 1, STRING_AGG(p.m[1], '' ORDER BY p.n), identificador
+    FROM regexp_matches(dado, '.{1,' || trecho || '}', 'g') WITH ORDINALITY AS p(m, n)
+    GROUP BY 1;
 END;
 $$ LANGUAGE plpgsql;
 
@@ -50,7 +52,7 @@ DECLARE
 BEGIN
     SELECT STRING_AGG(parte, '' ORDER BY sequencial) INTO resultado
     FROM dados
-    WHERE identificador = identificador;
+    WHERE dados.identificador = reconstruir_dados.identificador;
 
     RETURN resultado;
 END;
@@ -11,50 +11,212 @@ Objetivo:
 Requisitos:
  - Python 3.10+
  - pip install ttkbootstrap matplotlib pandas
+ - numpy (opcional) habilita o cálculo vetorizado (ColumnarResults) para inventários grandes
 
 Execução:
- python vacuum_analyzer.py
+ python vacuum_analyzer.py                                  # GUI
+ python vacuum_analyzer.py logs/*.log --format csv > out.csv  # modo batch (sem GUI)
+ pg_dump_vacuum | python vacuum_analyzer.py - --format table
+ python vacuum_analyzer.py --dsn postgresql://user:pw@db1/app --dsn-file fleet.txt --format json  # coleta direta
+
+ No modo batch só a biblioteca padrão é usada (tkinter/ttkbootstrap não são importados),
+ cada arquivo é processado em um processo separado (--workers) e o resultado combinado
+ é escrito no stdout em json, csv ou tabela.
+
+ Com --history arquivo.db cada análise é gravada em um histórico SQLite (append-only) e o
+ relatório ganha a taxa de crescimento de dead tuples e a previsão de quando o limite é atingido.
+
+ Com --dsn/--dsn-file a mesma consulta do pg_get_vacuum.sql é executada em paralelo
+ em todos os bancos (pip install asyncpg) e o resultado entra na mesma análise.
 
 Notas:
  - Este é um protótipo: parser baseado em expressões regulares que cobre os padrões comuns do VACUUM VERBOSE/ANALYZE.
+ - O parser é incremental (linha a linha, ver iter_log_records), então logs de vários GB podem ser lidos direto do arquivo/stdin.
  - Você pode colar a saída completa no campo "Saída" e clicar em "Analisar".
  - Ainda não está perfeito, mas é um ponto de partida.
 
 """
 
+import argparse
+import asyncio
+import csv
+import glob
+import hashlib
+import io
+import json
+import os
+import queue
 import re
-import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
-import ttkbootstrap as tb
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+# GUI modules are imported on demand by _load_gui(), so the batch mode
+# runs on headless hosts and starts fast.
+tk = ttk = messagebox = scrolledtext = tb = None
 
 # Vacuum & Analyze Enhanced Analyzer
 # - Parse ANALYZE VERBOSE and VACUUM VERBOSE (detailed blocks)
 # - Show results in a scrollable Treeview
 # - Compute Efficiency (%) and order recommendations by severity
 
+ANALYZE_START_RE = re.compile(r'analyzing\s+"(?P<table>[^"]+)"\s*$', re.IGNORECASE)
+ANALYZE_STATS_RE = re.compile(
+    r'\s*"[^"]+":\s*scanned\s+(?P<scanned>\d+)\s+of\s+(?P<total_pages>\d+)\s+pages,\s*containing\s+(?P<live>\d+)\s+live\s+rows\s+and\s+(?P<dead>\d+)\s+dead\s+rows;\s*(?P<sample>\d+)\s+rows\s+in\s+sample,\s*(?P<estimated>\d+)\s+estimated',
+    re.IGNORECASE,
+)
+VACUUM_START_RE = re.compile(r'vacuuming\s+"(?P<table>[^"]+)"', re.IGNORECASE)
+VACUUM_FINISH_RE = re.compile(r'finished\s+vacuuming\s+"(?P<table>[^"]+)":', re.IGNORECASE)
+PAGES_RE = re.compile(r'pages:\s*(?P<removed>\d+)\s*removed,\s*(?P<remain>\d+)\s*remain,\s*(?P<scanned>\d+)\s*scanned\s*\((?P<pct>[0-9\.]+)% of total\)', re.IGNORECASE)
+TUPLES_RE = re.compile(r'tuples:\s*(?P<removed>\d+)\s*removed,\s*(?P<remain>\d+)\s*remain,\s*(?P<dead>\d+)\s*are dead', re.IGNORECASE)
+ELAPSED_RE = re.compile(r'elapsed:\s*(?P<secs>[0-9\.]+)\s*s', re.IGNORECASE)
+
+# Read logs in 1 MiB chunks; the parser itself only ever holds the current line.
+READ_BUFFER_SIZE = 1 << 20
+
+
+def _vacuum_record(pages_m, tuples_m, elapsed_m):
+    """Build the VACUUM dict from the first pages/tuples/elapsed matches of a block."""
+    pages_removed = pages_remain = pages_scanned = pages_pct = 0
+    tup_removed = tup_remain = tup_dead = 0
+    elapsed = 0.0
+
+    if pages_m:
+        pages_removed = int(pages_m.group('removed'))
+        pages_remain = int(pages_m.group('remain'))
+        pages_scanned = int(pages_m.group('scanned'))
+        try:
+            pages_pct = float(pages_m.group('pct'))
+        except Exception:
+            pages_pct = 0.0
+    if tuples_m:
+        tup_removed = int(tuples_m.group('removed'))
+        tup_remain = int(tuples_m.group('remain'))
+        tup_dead = int(tuples_m.group('dead'))
+    if elapsed_m:
+        elapsed = float(elapsed_m.group('secs'))
+
+    return {
+        'pages_removed': pages_removed,
+        'pages_remain': pages_remain,
+        'pages_scanned': pages_scanned,
+        'pages_pct': pages_pct,
+        'tuples_removed': tup_removed,
+        'tuples_remain': tup_remain,
+        'tuples_dead': tup_dead,
+        'elapsed_s': elapsed,
+        'source': 'VACUUM'
+    }
+
+
+def iter_log_records(lines):
+    """Incrementally parse ANALYZE VERBOSE / VACUUM VERBOSE output.
+
+    `lines` is any iterable of text lines (open file, sys.stdin, io.StringIO...).
+    Works as a line-oriented state machine, so memory stays flat regardless of
+    the input size.
+
+    Yields (table, record) tuples; record['source'] is 'ANALYZE' or 'VACUUM' and
+    the dicts are the same ones parse_analyze_blocks / parse_vacuum_blocks return.
+    A VACUUM block runs from `vacuuming "t"` through `finished vacuuming "t":` and
+    its tail, up to the next `vacuuming "..."` line or the end of the input.
+
+    One difference from the old block regex: an unfinished `vacuuming "t"` block
+    followed by another `vacuuming "t"` that does finish is discarded, so the
+    numbers come from the block that finished. The regex spanned both blocks and
+    took pages/tuples from the first, unfinished one.
+    """
+    analyze_table = None          # table of the last `analyzing "..."` line
+    vac_table = None              # table of the open VACUUM block
+    vac_finished = False          # True once we are in the block tail
+    pages_m = tuples_m = elapsed_m = None
+
+    for line in lines:
+        line = line.rstrip('\r\n')
+        low = line.lower()
+
+        # ---- ANALYZE: `analyzing "t"` followed by the stats line
+        if analyze_table is not None:
+            if line.strip():
+                m = ANALYZE_STATS_RE.match(line)
+                if m:
+                    gd = m.groupdict()
+                    yield analyze_table, {
+                        'scanned': int(gd['scanned']),
+                        'total_pages': int(gd['total_pages']),
+                        'live': int(gd['live']),
+                        'dead': int(gd['dead']),
+                        'sample': int(gd['sample']),
+                        'estimated': int(gd['estimated']),
+                        'source': 'ANALYZE'
+                    }
+                analyze_table = None
+        if 'analyzing' in low:
+            m = ANALYZE_START_RE.search(line)
+            if m:
+                analyze_table = m.group('table')
+
+        # ---- VACUUM: block state machine
+        rest = line
+        if 'vacuuming' in low:
+            fm = VACUUM_FINISH_RE.search(line)
+            if fm:
+                # case-insensitive, like the (?P=table) backreference of the old IGNORECASE regex
+                if vac_table is not None and not vac_finished and fm.group('table').lower() == vac_table.lower():
+                    vac_finished = True
+                    rest = line[fm.end():]
+            else:
+                sm = VACUUM_START_RE.search(line)
+                if sm:
+                    if vac_table is not None and vac_finished:
+                        yield vac_table, _vacuum_record(pages_m, tuples_m, elapsed_m)
+                    # an unfinished block is dropped, like the old regex did
+                    vac_table = sm.group('table')
+                    vac_finished = False
+                    pages_m = tuples_m = elapsed_m = None
+                    rest = line[sm.end():]
+
+        if vac_table is not None:
+            if pages_m is None and 'pages:' in low:
+                pages_m = PAGES_RE.search(rest)
+            if tuples_m is None and 'tuples:' in low:
+                tuples_m = TUPLES_RE.search(rest)
+            if elapsed_m is None and 'elapsed:' in low:
+                elapsed_m = ELAPSED_RE.search(rest)
+
+    if vac_table is not None and vac_finished:
+        yield vac_table, _vacuum_record(pages_m, tuples_m, elapsed_m)
+
+
+def open_log(path):
+    """Open a log file for streaming; '-' means stdin."""
+    if path == '-':
+        return sys.stdin
+    return open(path, 'r', encoding='utf-8', errors='replace', buffering=READ_BUFFER_SIZE)
+
+
+def parse_log_stream(lines):
+    """Single pass over `lines`, returning (analyze_dict, vacuum_dict)."""
+    analyze = {}
+    vacuum = {}
+    for table, rec in iter_log_records(lines):
+        if rec['source'] == 'ANALYZE':
+            analyze[table] = rec
+        else:
+            vacuum[table] = rec
+    return analyze, vacuum
+
+
 def parse_analyze_blocks(text):
     """Parse ANALYZE VERBOSE lines like the example provided by the user.
 
     Returns dict: {table: {scanned, total_pages, live, dead, sample, estimated}}
     """
-    pattern = re.compile(
-        r'analyzing\s+"(?P<table>[^"]+)"\s*\n\s*"[^"]+":\s*scanned\s+(?P<scanned>\d+)\s+of\s+(?P<total_pages>\d+)\s+pages,\s*containing\s+(?P<live>\d+)\s+live\s+rows\s+and\s+(?P<dead>\d+)\s+dead\s+rows;\s*(?P<sample>\d+)\s+rows\s+in\s+sample,\s*(?P<estimated>\d+)\s+estimated',
-        re.IGNORECASE | re.MULTILINE,
-    )
-    results = {}
-    for m in pattern.finditer(text):
-        gd = m.groupdict()
-        table = gd['table']
-        results[table] = {
-            'scanned': int(gd['scanned']),
-            'total_pages': int(gd['total_pages']),
-            'live': int(gd['live']),
-            'dead': int(gd['dead']),
-            'sample': int(gd['sample']),
-            'estimated': int(gd['estimated']),
-            'source': 'ANALYZE'
-        }
-    return results
+    return {table: rec for table, rec in iter_log_records(io.StringIO(text))
+            if rec['source'] == 'ANALYZE'}
 
 def parse_vacuum_blocks(text):
     """Parse detailed VACUUM VERBOSE blocks between vacuuming "..." and the finished vacuuming line.
@@ -62,53 +224,23 @@ def parse_vacuum_blocks(text):
     For each block we extract pages, tuples, removed, frozen info and elapsed time if present.
 
     Returns dict: {table: {pages_removed, pages_remain, pages_scanned, pages_pct, tuples_removed, tuples_remain, tuples_dead, elapsed_s, source}}
+
+    An unfinished block is dropped; a later block of the same table that finishes wins:
+
+    >>> rec = parse_vacuum_blocks(
+    ...     'vacuuming "x"\\n'
+    ...     'pages: 0 removed, 10 remain, 10 scanned (100.00% of total)\\n'
+    ...     'tuples: 5 removed, 100 remain, 1 are dead\\n'
+    ...     'vacuuming "x"\\n'
+    ...     'pages: 0 removed, 20 remain, 20 scanned (100.00% of total)\\n'
+    ...     'tuples: 7 removed, 200 remain, 2 are dead\\n'
+    ...     'finished vacuuming "x": index scans: 0\\n'
+    ...     'elapsed: 0.01 s\\n')['x']
+    >>> rec['pages_remain'], rec['tuples_dead'], rec['elapsed_s']
+    (20, 2, 0.01)
     """
-    blocks = {}
-    # Find vacuuming ... finished vacuuming blocks (non-greedy)
-    block_pattern = re.compile(r'vacuuming\s+"(?P<table>[^"]+)"\s*(?P<body>.*?)finished\s+vacuuming\s+"(?P=table)":(?P<tail>.*?)(?=(?:\nvacuuming\s+"|\Z))', re.IGNORECASE | re.DOTALL)
-
-    pages_re = re.compile(r'pages:\s*(?P<removed>\d+)\s*removed,\s*(?P<remain>\d+)\s*remain,\s*(?P<scanned>\d+)\s*scanned\s*\((?P<pct>[0-9\.]+)% of total\)', re.IGNORECASE)
-    tuples_re = re.compile(r'tuples:\s*(?P<removed>\d+)\s*removed,\s*(?P<remain>\d+)\s*remain,\s*(?P<dead>\d+)\s*are dead', re.IGNORECASE)
-    elapsed_re = re.compile(r'elapsed:\s*(?P<secs>[0-9\.]+)\s*s', re.IGNORECASE)
-
-    for bm in block_pattern.finditer(text):
-        table = bm.group('table')
-        body = bm.group('body') + '\n' + (bm.group('tail') or '')
-        pages_m = pages_re.search(body)
-        tuples_m = tuples_re.search(body)
-        elapsed_m = elapsed_re.search(body)
-
-        pages_removed = pages_remain = pages_scanned = pages_pct = 0
-        tup_removed = tup_remain = tup_dead = 0
-        elapsed = 0.0
-
-        if pages_m:
-            pages_removed = int(pages_m.group('removed'))
-            pages_remain = int(pages_m.group('remain'))
-            pages_scanned = int(pages_m.group('scanned'))
-            try:
-                pages_pct = float(pages_m.group('pct'))
-            except Exception:
-                pages_pct = 0.0
-        if tuples_m:
-            tup_removed = int(tuples_m.group('removed'))
-            tup_remain = int(tuples_m.group('remain'))
-            tup_dead = int(tuples_m.group('dead'))
-        if elapsed_m:
-            elapsed = float(elapsed_m.group('secs'))
-
-        blocks[table] = {
-            'pages_removed': pages_removed,
-            'pages_remain': pages_remain,
-            'pages_scanned': pages_scanned,
-            'pages_pct': pages_pct,
-            'tuples_removed': tup_removed,
-            'tuples_remain': tup_remain,
-            'tuples_dead': tup_dead,
-            'elapsed_s': elapsed,
-            'source': 'VACUUM'
-        }
-    return blocks
+    return {table: rec for table, rec in iter_log_records(io.StringIO(text))
+            if rec['source'] == 'VACUUM'}
 
 def compute_efficiency(vac_entry):
     """Compute a simple efficiency metric (0-100).
@@ -162,8 +294,7 @@ def severity_score(entry):
             score += 10
     return score
 
-def analyze_text_and_generate(entries_analyze, entries_vacuum):
-    """Combine entries and produce table rows and ordered recommendations."""
+def _merge_entries(entries_analyze, entries_vacuum):
     combined = {}
     # normalize keys (tables may appear in both)
     for k, v in entries_analyze.items():
@@ -173,6 +304,20 @@ def analyze_text_and_generate(entries_analyze, entries_vacuum):
             combined[k].update(v)
         else:
             combined[k] = v.copy()
+    return combined
+
+def analyze_text_and_generate(entries_analyze, entries_vacuum, columnar=False):
+    """Combine entries and produce table rows and ordered recommendations.
+
+    With columnar=True and numpy installed the work is done by ColumnarResults;
+    the output is identical.
+    """
+    if columnar:
+        np = _numpy()
+        if np is not None:
+            res = ColumnarResults(entries_analyze, entries_vacuum, np)
+            return res.rows(), res.messages()
+    combined = _merge_entries(entries_analyze, entries_vacuum)
     # compute efficiency for vacuum entries (if present)
     rows = []
     recs = []
@@ -232,13 +377,846 @@ def analyze_text_and_generate(entries_analyze, entries_vacuum):
     sorted_msgs = [r[2] for r in recs]
     return rows, sorted_msgs
 
+def _numpy():
+    """numpy if installed, else None (it is only needed by the columnar path)."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class ColumnarResults:
+    """Merged entries stored as one typed numpy array per metric.
+
+    Efficiency, severity score and severity bucket are computed for every table
+    in one batch (same arithmetic as compute_efficiency / severity_score);
+    rows() and messages() return exactly what the dict path of
+    analyze_text_and_generate returns.
+    """
+
+    def __init__(self, entries_analyze, entries_vacuum, np):
+        self.np = np
+        combined = _merge_entries(entries_analyze, entries_vacuum)
+        self.tables = list(combined)
+        self.raw = raw = list(combined.values())
+        n = len(raw)
+
+        def col(key, dtype=np.int64, default=0):
+            return np.fromiter((v.get(key, default) for v in raw), dtype=dtype, count=n)
+
+        def has(key):
+            return np.fromiter((key in v for v in raw), dtype=bool, count=n)
+
+        self.source = [v.get('source', 'ANALYZE' if 'dead' in v else 'VACUUM') for v in raw]
+        is_vacuum = np.fromiter((s == 'VACUUM' for s in self.source), dtype=bool, count=n)
+        sev_analyze = np.fromiter((v.get('source') == 'ANALYZE' for v in raw), dtype=bool, count=n)
+
+        an_dead = col('dead')
+        an_live = self.live = col('live')
+        t_dead = col('tuples_dead')
+        t_removed = col('tuples_removed')
+        t_remain = col('tuples_remain')
+        pages_remain = col('pages_remain')
+        self.elapsed = col('elapsed_s', np.float64, 0.0)
+
+        has_tdead = has('tuples_dead')
+        self.dead = np.where(has_tdead, t_dead, an_dead)
+        self.pages_scanned = np.where(has('pages_scanned'), col('pages_scanned'), col('scanned'))
+        self.pages_total = np.where(has('pages_remain'), pages_remain, col('total_pages'))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # efficiency
+            tot_v = t_dead + t_removed + t_remain
+            eff_v = np.where(tot_v <= 0, 100.0, np.clip(100.0 - (t_dead / tot_v) * 100.0, 0.0, 100.0))
+            tot_a = an_dead + an_live
+            eff_a = np.where(tot_a == 0, 100.0, 100.0 - (an_dead / tot_a * 100.0))
+            eff = np.where(is_vacuum | has_tdead, eff_v,
+                           np.where(has('dead') | has('live'), eff_a, 100.0))
+            # severity_score
+            pct_a = np.where(tot_a > 0, an_dead / tot_a * 100.0, 0.0)
+            pct_v = np.where(tot_v > 0, t_dead / tot_v * 100.0, 0.0)
+        score_v = (np.floor(pct_v * 3) + np.floor(t_dead / 1000)
+                   + np.where(self.elapsed > 5.0, np.floor(np.minimum(20, self.elapsed)), 0)
+                   + np.where(pages_remain > 10000, 10, 0))
+        self.score = np.where(sev_analyze, np.floor(pct_a * 2), score_v).astype(np.int64)
+
+        # round() is applied per value: numpy's rounding differs from Python's in a few halfway cases
+        self.eff_list = [round(x, 1) for x in eff.tolist()]
+        self.eff = np.array(self.eff_list, dtype=np.float64)
+        for v, e in zip(raw, self.eff_list):
+            v['efficiency'] = e
+
+        dead = self.dead
+        self.bucket = np.select(
+            [(dead > 100000) | ((dead > 0) & (self.eff < 50)),
+             (dead > 10000) | ((dead > 0) & (self.eff < 70)),
+             dead > 0],
+            [3, 2, 1], 0)
+
+    def rows(self):
+        """Rows sorted by dead desc then efficiency asc."""
+        np = self.np
+        order = np.lexsort((self.eff, -self.dead)).tolist()
+        tables, source, raw, eff = self.tables, self.source, self.raw, self.eff_list
+        dead, live = self.dead.tolist(), self.live.tolist()
+        scanned, total, elapsed = self.pages_scanned.tolist(), self.pages_total.tolist(), self.elapsed.tolist()
+        return [{
+            'table': tables[i],
+            'source': source[i],
+            'eff': eff[i],
+            'dead': dead[i],
+            'live': live[i],
+            'pages_scanned': scanned[i],
+            'pages_total': total[i],
+            'elapsed_s': elapsed[i],
+            'raw': raw[i],
+        } for i in order]
+
+    def messages(self):
+        """Recommendations sorted by severity_score + bucket, then bucket."""
+        np = self.np
+        keys, sevs, msgs = [], [], []
+        dead, elapsed, scanned = self.dead.tolist(), self.elapsed.tolist(), self.pages_scanned.tolist()
+        for table, d, e, el, sc, b, score in zip(self.tables, dead, self.eff_list, elapsed, scanned,
+                                                 self.bucket.tolist(), self.score.tolist()):
+            if b == 3:
+                msg = f'⚠️ CRÍTICO — {table}: {d} linhas mortas; eficiência {e}%'
+            elif b == 2:
+                msg = f'⚠️ ALTA — {table}: {d} linhas mortas; eficiência {e}%'
+            elif b == 1:
+                msg = f'⚠️ — {table}: {d} linhas mortas; eficiência {e}%'
+            else:
+                msg = f'✅ {table}: sem linhas mortas aparente; eficiência {e}%'
+            keys.append(score + b)
+            sevs.append(b)
+            msgs.append(msg)
+            # extra hints
+            if el and el > 5.0:
+                keys.append(score + 1)
+                sevs.append(1)
+                msgs.append(f'⏱️ Demorado: {el:.2f} s')
+            if sc and sc > 1000:
+                keys.append(score + 1)
+                sevs.append(1)
+                msgs.append(f'📄 Muitas páginas escaneadas: {sc}')
+        order = np.lexsort((-np.array(sevs, dtype=np.int64), -np.array(keys, dtype=np.int64)))
+        return [msgs[i] for i in order.tolist()]
+
+
+class AnalysisModel:
+    """Parsed result of one input text: raw entries, rows and recommendations.
+
+    Built once per analysis and cached by the UI under `key` (a hash of the
+    input), so detail lookups don't need to parse the text again.
+    """
+
+    def __init__(self, key, entries_analyze, entries_vacuum):
+        self.key = key
+        self.analyze = entries_analyze
+        self.vacuum = entries_vacuum
+        self.rows, self.recs = analyze_text_and_generate(entries_analyze, entries_vacuum, columnar=True)
+
+    @staticmethod
+    def text_key(text):
+        return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+    def details(self, table):
+        """Text shown in the details dialog for `table`."""
+        details = ''
+        if table in self.vacuum:
+            details += f'-- VACUUM data for {table}:\n'
+            for k, v in self.vacuum[table].items():
+                details += f'{k}: {v}\n'
+        if table in self.analyze:
+            details += f'\n-- ANALYZE data for {table}:\n'
+            for k, v in self.analyze[table].items():
+                details += f'{k}: {v}\n'
+        if not details:
+            details = 'Sem detalhes estruturados para esta tabela.'
+        return details
+
+# ---------------- Live collector ----------------
+# Numeric version of pg_get_vacuum.sql (pg_stat_user_tables + reloptions joins)
+COLLECT_SQL = """
+SELECT t.schemaname || '.' || t.relname                                AS table_name
+     , t.n_tup_upd + t.n_tup_del                                        AS upd_del
+     , t.n_live_tup                                                     AS live
+     , t.n_dead_tup                                                     AS dead
+     , pg_relation_size(t.relid)                                        AS size_bytes
+     , pg_relation_size(t.relid) / current_setting('block_size')::int   AS pages
+     , coalesce(c.scale, s.setting)::float8                             AS scale_factor
+     , e.enabled IS NULL                                                AS autovacuum_enabled
+FROM pg_stat_user_tables t
+         LEFT JOIN (SELECT trim('autovacuum_vacuum_scale_factor=' FROM reloptions) scale, oid
+                    FROM (SELECT unnest(reloptions) reloptions, oid FROM pg_class WHERE reloptions IS NOT NULL) i
+                    WHERE reloptions LIKE 'autovacuum_vacuum_scale_factor=%') c ON t.relid = c.oid
+         LEFT JOIN (SELECT FALSE enabled, oid
+                    FROM (SELECT unnest(reloptions) reloptions, oid FROM pg_class WHERE reloptions IS NOT NULL) i
+                    WHERE reloptions LIKE 'autovacuum_enabled=false') e ON t.relid = e.oid
+         JOIN pg_settings s ON s.name = 'autovacuum_vacuum_scale_factor'
+"""
+
+
+def dsn_label(dsn):
+    """host:port/dbname for a postgresql:// DSN (never includes the password)."""
+    parts = urlsplit(dsn)
+    host = parts.hostname or 'localhost'
+    db = parts.path.lstrip('/') or parts.username or ''
+    return f'{host}:{parts.port or 5432}/{db}'
+
+
+def catalog_entry(rec, label):
+    """Normalize one COLLECT_SQL row into the ANALYZE-shaped dict analyze_text_and_generate takes."""
+    return {
+        'scanned': 0,
+        'total_pages': rec['pages'],
+        'live': rec['live'],
+        'dead': rec['dead'],
+        'sample': 0,
+        'estimated': rec['live'],
+        'source': 'ANALYZE',
+        'host': label,
+        'size_bytes': rec['size_bytes'],
+        'upd_del': rec['upd_del'],
+        'scale_factor': rec['scale_factor'],
+        'autovacuum_enabled': rec['autovacuum_enabled'],
+    }
+
+
+class CatalogCollector:
+    """Run COLLECT_SQL against many DSNs concurrently.
+
+    One asyncpg pool per DSN (kept open between collect() calls), at most
+    `per_host` databases queried at once on the same server and `concurrency`
+    overall. Every DSN gets a single `timeout` deadline for connect + query.
+    """
+
+    def __init__(self, dsns, per_host=2, concurrency=32, timeout=30.0):
+        try:
+            import asyncpg
+        except ImportError:
+            raise SystemExit('o modo coleta precisa do asyncpg: pip install asyncpg')
+        self.asyncpg = asyncpg
+        self.dsns = list(dsns)
+        self.per_host = per_host
+        self.timeout = timeout
+        self.pools = {}
+        self.errors = {}
+        self._global = asyncio.Semaphore(concurrency)
+        self._hosts = {}
+        for dsn in self.dsns:
+            host = urlsplit(dsn).hostname or 'localhost'
+            self._hosts.setdefault(host, asyncio.Semaphore(per_host))
+
+    async def _pool(self, dsn):
+        # one query per DSN per collect(), so a single connection is enough
+        pool = self.pools.get(dsn)
+        if pool is None:
+            pool = await self.asyncpg.create_pool(dsn, min_size=1, max_size=1, timeout=self.timeout)
+            self.pools[dsn] = pool
+        return pool
+
+    async def _collect_one(self, dsn):
+        host_sem = self._hosts[urlsplit(dsn).hostname or 'localhost']
+        async with self._global, host_sem:
+            # a single deadline for connect + query (waiting for the semaphores doesn't count).
+            # The pool setup is bounded by its own connect timeout rather than wait_for: cancelling
+            # create_pool halfway would leave the connections it already opened behind.
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.timeout
+            pool = await self._pool(dsn)
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            return await asyncio.wait_for(pool.fetch(COLLECT_SQL), remaining)
+
+    async def collect(self):
+        """One snapshot of the fleet: {'host:port/db:schema.table': entry}."""
+        results = await asyncio.gather(*(self._collect_one(d) for d in self.dsns), return_exceptions=True)
+        entries = {}
+        self.errors = {}
+        for dsn, res in zip(self.dsns, results):
+            label = dsn_label(dsn)
+            if isinstance(res, BaseException):
+                self.errors[label] = res
+                print(f'aviso: falha coletando {label}: {res!r}', file=sys.stderr)
+                continue
+            for rec in res:
+                entries[f"{label}:{rec['table_name']}"] = catalog_entry(rec, label)
+        return entries
+
+    async def close(self):
+        await asyncio.gather(*(p.close() for p in self.pools.values()), return_exceptions=True)
+        self.pools = {}
+
+
+def read_dsns(dsns, dsn_file=None):
+    """DSNs from --dsn plus one per line of --dsn-file (blank lines and # comments ignored)."""
+    out = list(dsns or [])
+    if dsn_file:
+        with open(dsn_file, encoding='utf-8') as fh:
+            out += [ln.strip() for ln in fh if ln.strip() and not ln.lstrip().startswith('#')]
+    return out
+
+
+async def collect_fleet(dsns, per_host=2, concurrency=32, timeout=30.0):
+    collector = CatalogCollector(dsns, per_host=per_host, concurrency=concurrency, timeout=timeout)
+    try:
+        return await collector.collect()
+    finally:
+        await collector.close()
+
+
+# ---------------- Snapshot history ----------------
+def row_host(row, default):
+    """History host of an analysis row: the collector's label, or `default` for rows from logs."""
+    return row['raw'].get('host', default)
+
+
+class SnapshotStore:
+    """Append-only SQLite history of analysis rows, keyed by (host, table, timestamp).
+
+    Each analysis is one snapshot (same `ts` for all its rows). Growth rates are
+    computed from the last N snapshots of every host.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS samples (
+        host       TEXT    NOT NULL,
+        tbl        TEXT    NOT NULL,
+        ts         REAL    NOT NULL,
+        live       INTEGER NOT NULL,
+        dead       INTEGER NOT NULL,
+        pages      INTEGER NOT NULL,
+        efficiency REAL    NOT NULL,
+        PRIMARY KEY (host, tbl, ts)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS samples_host_ts ON samples (host, ts);
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def append(self, rows, host='local', ts=None):
+        """Store one snapshot of analysis rows. Rows from the collector keep their own host."""
+        ts = time.time() if ts is None else ts
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, ?, ?)',
+                ((row_host(r, host), r['table'], ts, r['live'], r['dead'], r['pages_total'], r['eff'])
+                 for r in rows))
+        return ts
+
+    def load_recent(self, last_n=12, hosts=None):
+        """Yield (host, table, [(ts, dead), ...]) over the last `last_n` snapshots of each host.
+
+        `hosts` limits the history to those hosts (default: every host in the file).
+        """
+        known = [h for (h,) in self.conn.execute('SELECT DISTINCT host FROM samples')]
+        for host in known if hosts is None else [h for h in known if h in hosts]:
+            cutoff = self.conn.execute(
+                'SELECT min(ts) FROM (SELECT DISTINCT ts FROM samples WHERE host = ? ORDER BY ts DESC LIMIT ?)',
+                (host, last_n)).fetchone()[0]
+            cur = self.conn.execute(
+                'SELECT tbl, ts, dead FROM samples WHERE host = ? AND ts >= ? ORDER BY tbl, ts', (host, cutoff))
+            table, points = None, []
+            for tbl, ts, dead in cur:
+                if tbl != table:
+                    if points:
+                        yield host, table, points
+                    table, points = tbl, []
+                points.append((ts, dead))
+            if points:
+                yield host, table, points
+
+    def trends(self, last_n=12, dead_threshold=100000, hosts=None):
+        """Dead-tuple growth per table: {(host, table): {dead, dead_per_hour, hours_to_threshold, samples}}.
+
+        dead_per_hour is the least-squares slope over the snapshots; hours_to_threshold
+        is 0 when the table is already above `dead_threshold` and None when dead
+        tuples are not growing (or there is a single snapshot).
+        """
+        out = {}
+        for host, table, points in self.load_recent(last_n, hosts):
+            last_dead = points[-1][1]
+            rate = 0.0
+            if len(points) > 1:
+                t0 = points[0][0]
+                xs = [(ts - t0) / 3600.0 for ts, _ in points]
+                ys = [d for _, d in points]
+                mx = sum(xs) / len(xs)
+                my = sum(ys) / len(ys)
+                var = sum((x - mx) ** 2 for x in xs)
+                if var > 0:
+                    rate = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var
+            if last_dead >= dead_threshold:
+                eta = 0.0
+            elif rate > 0:
+                eta = (dead_threshold - last_dead) / rate
+            else:
+                eta = None
+            out[(host, table)] = {
+                'dead': last_dead,
+                'dead_per_hour': round(rate, 1),
+                'hours_to_threshold': None if eta is None else round(eta, 1),
+                'samples': len(points),
+            }
+        return out
+
+
+def trend_messages(trends, dead_threshold=100000):
+    """Recommendations for growing tables, soonest to reach the threshold first."""
+    growing = [(k, v) for k, v in trends.items() if v['dead_per_hour'] > 0 and v['hours_to_threshold'] is not None]
+    growing.sort(key=lambda kv: (kv[1]['hours_to_threshold'], -kv[1]['dead_per_hour']))
+    msgs = []
+    for (host, table), v in growing:
+        # collector tables are already prefixed with their host label
+        table = table if table.startswith(f'{host}:') else f'{host}:{table}'
+        if v['hours_to_threshold'] == 0:
+            msgs.append(f'📈 {table}: +{v["dead_per_hour"]:.0f} linhas mortas/h e já acima de {dead_threshold}')
+        else:
+            msgs.append(f'📈 {table}: +{v["dead_per_hour"]:.0f} linhas mortas/h; atinge {dead_threshold} em ~{v["hours_to_threshold"]:.1f} h')
+    return msgs
+
+
+# ---------------- Batch / CLI ----------------
+REPORT_COLUMNS = ('table', 'source', 'dead', 'live', 'pages_scanned', 'pages_total', 'elapsed_s', 'eff')
+
+
+def expand_paths(patterns):
+    """Expand globs (also when the shell didn't) keeping order and dropping duplicates."""
+    paths = []
+    seen = set()
+    for pat in patterns:
+        matches = sorted(glob.glob(pat)) if pat != '-' and glob.has_magic(pat) else [pat]
+        if not matches:
+            print(f'aviso: nenhum arquivo para {pat}', file=sys.stderr)
+        for path in matches:
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+def parse_log_file(path):
+    """Parse one log file (or '-' for stdin). Returns (analyze_dict, vacuum_dict)."""
+    if path == '-':
+        return parse_log_stream(sys.stdin)
+    with open_log(path) as fh:
+        return parse_log_stream(fh)
+
+
+def parse_log_files(paths, workers=None, qualify=False):
+    """Parse many files, one file per worker process, and merge the results.
+
+    Later files win when the same table shows up more than once, unless
+    `qualify` is set, in which case table names are prefixed with the file name.
+    """
+    files = [p for p in paths if p != '-']
+    if workers is None:
+        workers = min(len(files), os.cpu_count() or 1)
+    if workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = dict(zip(files, pool.map(parse_log_file, files)))
+    else:
+        parsed = {p: parse_log_file(p) for p in files}
+
+    analyze = {}
+    vacuum = {}
+    for path in paths:
+        an, vac = parse_log_file('-') if path == '-' else parsed[path]
+        if qualify:
+            label = 'stdin' if path == '-' else os.path.basename(path)
+            an = {f'{label}:{t}': v for t, v in an.items()}
+            vac = {f'{label}:{t}': v for t, v in vac.items()}
+        analyze.update(an)
+        vacuum.update(vac)
+    return analyze, vacuum
+
+
+def write_report(rows, recs, fmt, out, trends=None, trend_msgs=None, host='local'):
+    """Write analysis rows + recommendations as json, csv or a plain text table.
+
+    `trends` / `trend_msgs` come from SnapshotStore when --history is used; `host` is
+    the history host of the rows that came from log files.
+    """
+    if fmt == 'json':
+        doc = {'rows': rows, 'recommendations': recs}
+        if trends is not None:
+            doc['trends'] = [{'host': h, 'table': t, **v} for (h, t), v in trends.items()]
+            doc['trend_recommendations'] = trend_msgs
+        json.dump(doc, out, ensure_ascii=False, indent=2)
+        out.write('\n')
+    elif fmt == 'csv':
+        writer = csv.writer(out)
+        if trends is None:
+            writer.writerow(REPORT_COLUMNS)
+            for r in rows:
+                writer.writerow([r[c] for c in REPORT_COLUMNS])
+        else:
+            writer.writerow(REPORT_COLUMNS + ('dead_per_hour', 'hours_to_threshold'))
+            for r in rows:
+                tr = trends.get((row_host(r, host), r['table']), {})
+                writer.writerow([r[c] for c in REPORT_COLUMNS] + [tr.get('dead_per_hour'), tr.get('hours_to_threshold')])
+    else:
+        width = max([len('Tabela')] + [len(r['table']) for r in rows])
+        header = f"{'Tabela':<{width}} {'Fonte':<7} {'Dead':>12} {'Live':>12} {'Pgs Scanned':>12} {'Pgs Total':>12} {'Elapsed(s)':>10} {'Eficiência(%)':>13}"
+        out.write(header + '\n')
+        out.write('-' * len(header) + '\n')
+        for r in rows:
+            out.write(f"{r['table']:<{width}} {r['source']:<7} {r['dead']:>12} {r['live']:>12} {r['pages_scanned']:>12} "
+                      f"{r['pages_total']:>12} {r['elapsed_s']:>10.2f} {r['eff']:>13.1f}\n")
+        out.write('\nRecomendações (ordenadas por importância):\n')
+        for msg in recs or ['Nenhuma recomendação gerada.']:
+            out.write(msg + '\n')
+        if trends is not None:
+            out.write('\nTendências (histórico):\n')
+            for msg in trend_msgs or ['Nenhuma tabela com crescimento de linhas mortas.']:
+                out.write(msg + '\n')
+
+
+def parse_cli_args(argv=None):
+    p = argparse.ArgumentParser(description='Analisa saídas de VACUUM VERBOSE / ANALYZE VERBOSE. Sem arquivos abre a GUI.')
+    p.add_argument('paths', nargs='*', help="arquivos de log ou globs ('-' para stdin)")
+    p.add_argument('--format', choices=('table', 'json', 'csv'), default='table')
+    p.add_argument('--workers', type=int, help='processos para o parse (padrão: um por arquivo, até o nº de CPUs)')
+    p.add_argument('--qualify', action='store_true', help='prefixa o nome das tabelas com o nome do arquivo')
+    p.add_argument('--columnar', action='store_true', help='usa o cálculo vetorizado (numpy), se instalado')
+    g = p.add_argument_group('histórico de snapshots')
+    g.add_argument('--history', help='arquivo SQLite onde cada análise é gravada')
+    g.add_argument('--history-host', default='local', help='host gravado para as linhas vindas de logs')
+    g.add_argument('--history-last', type=int, default=12, help='snapshots usados no cálculo de tendência')
+    g.add_argument('--dead-threshold', type=int, default=100000, help='limite de linhas mortas para a previsão')
+    g = p.add_argument_group('coleta direta (pg_get_vacuum.sql via asyncpg)')
+    g.add_argument('--dsn', action='append', default=[], help='postgresql://user:pw@host:port/db (pode repetir)')
+    g.add_argument('--dsn-file', help='arquivo com um DSN por linha')
+    g.add_argument('--per-host', type=int, default=2, help='bancos consultados ao mesmo tempo por servidor')
+    g.add_argument('--concurrency', type=int, default=32, help='bancos consultados ao mesmo tempo no total')
+    g.add_argument('--timeout', type=float, default=30.0, help='timeout (s) de conexão + consulta por banco')
+    return p.parse_args(argv)
+
+
+def run_cli(args):
+    paths = expand_paths(args.paths)
+    dsns = read_dsns(args.dsn, args.dsn_file)
+    if not paths and not dsns:
+        return 1
+    missing = [p for p in paths if p != '-' and not os.path.isfile(p)]
+    if missing:
+        for p in missing:
+            print(f'erro: arquivo não encontrado ou não é um arquivo: {p}', file=sys.stderr)
+        return 2
+    try:
+        an, vac = parse_log_files(paths, workers=args.workers, qualify=args.qualify)
+    except OSError as e:
+        print(f'erro: {e}', file=sys.stderr)
+        return 2
+    if dsns:
+        an.update(asyncio.run(collect_fleet(dsns, per_host=args.per_host,
+                                            concurrency=args.concurrency, timeout=args.timeout)))
+    rows, recs = analyze_text_and_generate(an, vac, columnar=args.columnar)
+    trends = trend_msgs = None
+    if args.history:
+        store = SnapshotStore(args.history)
+        try:
+            store.append(rows, host=args.history_host)
+            hosts = {row_host(r, args.history_host) for r in rows}
+            trends = store.trends(args.history_last, args.dead_threshold, hosts=hosts)
+        finally:
+            store.close()
+        trend_msgs = trend_messages(trends, args.dead_threshold)
+    write_report(rows, recs, args.format, sys.stdout, trends, trend_msgs, host=args.history_host)
+    return 0
+
+
+def _load_gui():
+    """Import tkinter/ttkbootstrap; only the GUI path pays for it."""
+    global tk, ttk, messagebox, scrolledtext, tb
+    import tkinter as tk
+    from tkinter import ttk, messagebox, scrolledtext
+    import ttkbootstrap as tb
+
+
+def run_gui():
+    _load_gui()
+    root = tb.Window(themename='darkly')
+    app = AnalyzerUI(root)
+    root.mainloop()
+
+
+def main(argv=None):
+    args = parse_cli_args(argv)
+    if not args.paths and not args.dsn and not args.dsn_file:
+        run_gui()
+        return 0
+    return run_cli(args)
+
 # ---------------- UI ----------------
+# Progress is posted every PROGRESS_LINES lines; the UI polls the queue every POLL_MS.
+PROGRESS_LINES = 20000
+POLL_MS = 50
+
+
+class AnalysisCancelled(Exception):
+    pass
+
+
+def analysis_worker(raw, out_q, cancel, cached=None):
+    """Parse `raw` off the Tk thread, posting messages to `out_q`.
+
+    Messages: ('progress', fraction, n_tables), ('done', AnalysisModel),
+    ('cancelled',) or ('error', exc). `cancel` is a threading.Event checked
+    while reading lines. `cached` is returned as-is if its key matches the text.
+    """
+    try:
+        key = AnalysisModel.text_key(raw)
+        if cached is not None and cached.key == key:
+            out_q.put(('done', cached))
+            return
+        total = max(len(raw), 1)
+        an = {}
+        vac = {}
+
+        def lines():
+            read = 0
+            for n, line in enumerate(io.StringIO(raw), 1):
+                read += len(line)
+                if n % PROGRESS_LINES == 0:
+                    if cancel.is_set():
+                        raise AnalysisCancelled()
+                    out_q.put(('progress', read / total, len(an) + len(vac)))
+                yield line
+
+        for table, rec in iter_log_records(lines()):
+            if rec['source'] == 'ANALYZE':
+                an[table] = rec
+            else:
+                vac[table] = rec
+        if cancel.is_set():
+            raise AnalysisCancelled()
+        out_q.put(('progress', 1.0, len(an) + len(vac)))
+        out_q.put(('done', AnalysisModel(key, an, vac)))
+    except AnalysisCancelled:
+        out_q.put(('cancelled',))
+    except Exception as e:
+        out_q.put(('error', e))
+
+
+# Treeview columns -> keys in the analysis rows
+TREE_COLUMNS = (
+    ('Tabela', 'table'), ('Fonte', 'source'), ('Dead', 'dead'), ('Live', 'live'),
+    ('Pgs Scanned', 'pages_scanned'), ('Pgs Total', 'pages_total'),
+    ('Elapsed(s)', 'elapsed_s'), ('Eficiência(%)', 'eff'),
+)
+
+
+def row_values(r):
+    return (r['table'], r['source'], r['dead'], r['live'], r['pages_scanned'], r['pages_total'], f"{r['elapsed_s']:.2f}", f"{r['eff']:.1f}")
+
+
+def row_tag(r):
+    # tag by efficiency
+    eff = r['eff']
+    return 'bad' if eff < 30 else 'warn' if eff < 70 else 'ok'
+
+
+class VirtualTable:
+    """Treeview that only materializes the visible window of a (possibly huge) row list.
+
+    The Treeview holds a fixed set of item "slots", one per visible line; scrolling
+    just rewrites their values. Sorting and filtering work on `view`, a list of
+    indexes into `rows`, so neither rebuilds the widget.
+    """
+
+    def __init__(self, parent, columns):
+        self.frame = ttk.Frame(parent)
+        self.columns = columns
+        names = [c for c, _ in columns]
+        self.tree = ttk.Treeview(self.frame, columns=names, show='headings', selectmode='browse')
+        for c, key in columns:
+            self.tree.heading(c, text=c, command=lambda k=key: self.sort_by(k))
+            # give efficiency a bit more width
+            if c == 'Tabela':
+                self.tree.column(c, width=350, anchor='w')
+            elif c == 'Eficiência(%)':
+                self.tree.column(c, width=110, anchor='center')
+            else:
+                self.tree.column(c, width=100, anchor='center')
+        self.tree.tag_configure('bad', background='#4c1f1f')
+        self.tree.tag_configure('warn', background='#4c3a1f')
+        self.tree.tag_configure('ok', background='#113322')
+
+        self.ysb = ttk.Scrollbar(self.frame, orient='vertical', command=self._on_scrollbar)
+        self.ysb.pack(side='right', fill='y')
+        self.tree.pack(fill='both', expand=True, side='left')
+
+        self.rows = []
+        self.view = []          # indexes into rows, filtered + sorted
+        self.top = 0            # position in view of the first slot
+        self.slots = []         # Treeview item ids, one per visible line
+        self.selected = None    # index into rows of the selected row
+        self.sort_key = None
+        self.sort_desc = False
+        self.filter_fn = None
+        self._rendering = False
+
+        self.tree.bind('<Configure>', self._on_resize)
+        self.tree.bind('<MouseWheel>', self._on_wheel)
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(3))
+        self.tree.bind('<Up>', lambda e: self._move_selection(-1))
+        self.tree.bind('<Down>', lambda e: self._move_selection(1))
+        self.tree.bind('<Prior>', lambda e: self.scroll(-len(self.slots)))
+        self.tree.bind('<Next>', lambda e: self.scroll(len(self.slots)))
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+
+    def pack(self, **kw):
+        self.frame.pack(**kw)
+
+    def bind(self, seq, func):
+        self.tree.bind(seq, func)
+
+    # ---- data
+    def set_rows(self, rows):
+        self.rows = rows
+        self.selected = None
+        self._rebuild_view()
+
+    def sort_by(self, key):
+        if self.sort_key == key:
+            self.sort_desc = not self.sort_desc
+        else:
+            self.sort_key, self.sort_desc = key, key not in ('table', 'source', 'eff')
+        for c, k in self.columns:
+            arrow = (' ▼' if self.sort_desc else ' ▲') if k == key else ''
+            self.tree.heading(c, text=c + arrow)
+        self._rebuild_view()
+
+    def set_filter(self, fn):
+        """Show only rows for which fn(row) is true (None shows everything)."""
+        self.filter_fn = fn
+        self._rebuild_view()
+
+    def selected_row(self):
+        return None if self.selected is None else self.rows[self.selected]
+
+    def _rebuild_view(self):
+        rows = self.rows
+        view = range(len(rows))
+        if self.filter_fn is not None:
+            view = [i for i in view if self.filter_fn(rows[i])]
+        if self.sort_key is not None:
+            key = self.sort_key
+            view = sorted(view, key=lambda i: rows[i][key], reverse=self.sort_desc)
+        self.view = list(view)
+        self.top = 0
+        self._render()
+
+    # ---- viewport
+    def _visible_count(self):
+        rowheight = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+        # one line is taken by the headings
+        return max(1, self.tree.winfo_height() // rowheight - 1)
+
+    def _on_resize(self, event=None):
+        n = self._visible_count()
+        if n != len(self.slots):
+            if n > len(self.slots):
+                self.slots += [self.tree.insert('', 'end') for _ in range(n - len(self.slots))]
+            else:
+                self.tree.delete(*self.slots[n:])
+                del self.slots[n:]
+            self._render()
+
+    def scroll(self, delta):
+        self._set_top(self.top + delta)
+        return 'break'
+
+    def _set_top(self, top):
+        top = max(0, min(top, len(self.view) - len(self.slots)))
+        if top != self.top:
+            self.top = top
+            self._render()
+
+    def _on_scrollbar(self, *args):
+        if args[0] == 'moveto':
+            self._set_top(int(float(args[1]) * len(self.view)))
+        elif args[0] == 'scroll':
+            step = len(self.slots) if args[2] == 'pages' else 1
+            self.scroll(int(args[1]) * step)
+
+    def _on_wheel(self, event):
+        return self.scroll(-3 if event.delta > 0 else 3)
+
+    def _render(self):
+        self._rendering = True
+        try:
+            sel_slot = None
+            for n, iid in enumerate(self.slots):
+                pos = self.top + n
+                if pos < len(self.view):
+                    idx = self.view[pos]
+                    r = self.rows[idx]
+                    self.tree.item(iid, values=row_values(r), tags=(row_tag(r),))
+                    if idx == self.selected:
+                        sel_slot = iid
+                else:
+                    self.tree.item(iid, values=(), tags=())
+            if sel_slot:
+                self.tree.selection_set(sel_slot)
+            else:
+                self.tree.selection_set(())
+        finally:
+            self._rendering = False
+        total = len(self.view)
+        if total:
+            self.ysb.set(self.top / total, min(1.0, (self.top + len(self.slots)) / total))
+        else:
+            self.ysb.set(0, 1)
+
+    # ---- selection follows the data, not the slot
+    def _on_select(self, event=None):
+        if self._rendering:
+            return
+        sel = self.tree.selection()
+        if not sel or sel[0] not in self.slots:
+            return
+        pos = self.top + self.slots.index(sel[0])
+        self.selected = self.view[pos] if pos < len(self.view) else None
+
+    def _move_selection(self, step):
+        if not self.view:
+            return 'break'
+        try:
+            pos = self.view.index(self.selected) + step
+        except ValueError:
+            pos = self.top
+        pos = max(0, min(pos, len(self.view) - 1))
+        self.selected = self.view[pos]
+        if pos < self.top:
+            self._set_top(pos)
+        elif pos >= self.top + len(self.slots):
+            self._set_top(pos - len(self.slots) + 1)
+        self._render()
+        return 'break'
+
+
 class AnalyzerUI:
     def __init__(self, root):
         self.root = root
         self.root.title('Vacuum & Analyze Enhanced')
         self.root.geometry('1000x700')
         self.style = tb.Style('darkly')
+        self.model = None  # AnalysisModel of the last analyzed text
+        self._queue = None  # messages from the running analysis_worker
+        self._cancel = None
         self._build()
 
     def _build(self):
@@ -251,29 +1229,33 @@ class AnalyzerUI:
         self.input_txt = scrolledtext.ScrolledText(frm, height=14)
         self.input_txt.pack(fill='both', expand=False)
 
-        btn = ttk.Button(frm, text='Analisar', command=self.on_analyze)
-        btn.pack(pady=6)
+        bar = ttk.Frame(frm)
+        bar.pack(fill='x', pady=6)
+        self.analyze_btn = ttk.Button(bar, text='Analisar', command=self.on_analyze)
+        self.analyze_btn.pack(side='left')
+        self.cancel_btn = ttk.Button(bar, text='Cancelar', command=self.on_cancel, state='disabled')
+        self.cancel_btn.pack(side='left', padx=6)
+        self.progress = ttk.Progressbar(bar, mode='determinate', maximum=100)
+        self.progress.pack(side='left', fill='x', expand=True, padx=6)
+        self.status_lbl = ttk.Label(bar, text='', width=40)
+        self.status_lbl.pack(side='left')
 
-        # Results frame with treeview + scrollbar
-        res_frame = ttk.Frame(frm)
-        res_frame.pack(fill='both', expand=True)
+        # Filters applied on the underlying rows (the view is virtualized)
+        flt = ttk.Frame(frm)
+        flt.pack(fill='x', pady=(0, 4))
+        self.filter_vars = {}
+        for label, name, width in (('Tabela contém:', 'table', 30), ('Dead ≥', 'dead', 10), ('Eficiência ≤', 'eff', 8)):
+            ttk.Label(flt, text=label).pack(side='left', padx=(0, 4))
+            var = tk.StringVar()
+            ttk.Entry(flt, textvariable=var, width=width).pack(side='left', padx=(0, 12))
+            var.trace_add('write', self._schedule_filter)
+            self.filter_vars[name] = var
+        self._filter_job = None
 
-        cols = ('Tabela', 'Fonte', 'Dead', 'Live', 'Pgs Scanned', 'Pgs Total', 'Elapsed(s)', 'Eficiência(%)')
-        self.tree = ttk.Treeview(res_frame, columns=cols, show='headings', selectmode='browse')
-        for c in cols:
-            self.tree.heading(c, text=c)
-            # give efficiency a bit more width
-            if c == 'Tabela':
-                self.tree.column(c, width=350, anchor='w')
-            elif c == 'Eficiência(%)':
-                self.tree.column(c, width=110, anchor='center')
-            else:
-                self.tree.column(c, width=100, anchor='center')
-
-        ysb = ttk.Scrollbar(res_frame, orient='vertical', command=self.tree.yview)
-        self.tree.configure(yscroll=ysb.set)
-        ysb.pack(side='right', fill='y')
-        self.tree.pack(fill='both', expand=True, side='left')
+        # Results: virtualized treeview + scrollbar
+        self.table = VirtualTable(frm, TREE_COLUMNS)
+        self.table.pack(fill='both', expand=True)
+        self.tree = self.table.tree
 
         # Recommendations box
         rec_label = ttk.Label(frm, text='Recomendações (ordenadas por importância):')
@@ -282,34 +1264,87 @@ class AnalyzerUI:
         self.rec_txt.pack(fill='both', expand=False)
 
         # double click row -> show raw details
-        self.tree.bind('<Double-1>', self.on_row_double)
+        self.table.bind('<Double-1>', self.on_row_double)
+
+    def _schedule_filter(self, *args):
+        # debounce typing
+        if self._filter_job is not None:
+            self.root.after_cancel(self._filter_job)
+        self._filter_job = self.root.after(200, self._apply_filter)
+
+    def _apply_filter(self):
+        self._filter_job = None
+        text = self.filter_vars['table'].get().strip().lower()
+        try:
+            min_dead = int(self.filter_vars['dead'].get() or 0)
+        except ValueError:
+            min_dead = 0
+        try:
+            max_eff = float(self.filter_vars['eff'].get().replace(',', '.') or 100)
+        except ValueError:
+            max_eff = 100.0
+        if not text and min_dead <= 0 and max_eff >= 100:
+            self.table.set_filter(None)
+            return
+        self.table.set_filter(lambda r: r['dead'] >= min_dead and r['eff'] <= max_eff
+                              and (not text or text in r['table'].lower()))
 
     def on_analyze(self):
         raw = self.input_txt.get('1.0', 'end').strip()
         if not raw:
             messagebox.showwarning('Nada para analisar', 'Cole a saída do VACUUM/ANALYZE antes de analisar.')
             return
-        an = parse_analyze_blocks(raw)
-        vac = parse_vacuum_blocks(raw)
-        rows, recs = analyze_text_and_generate(an, vac)
+        if self._queue is not None:
+            return
+        self.input_txt.edit_modified(False)
+        self._queue = queue.Queue()
+        self._cancel = threading.Event()
+        self._set_running(True)
+        self.status_lbl.configure(text='Analisando...')
+        threading.Thread(target=analysis_worker, args=(raw, self._queue, self._cancel, self.model), daemon=True).start()
+        self.root.after(POLL_MS, self._poll)
 
-        # populate tree
-        self.tree.delete(*self.tree.get_children())
-        for r in rows:
-            values = (r['table'], r['source'], r['dead'], r['live'], r['pages_scanned'], r['pages_total'], f"{r['elapsed_s']:.2f}", f"{r['eff']:.1f}")
-            item = self.tree.insert('', 'end', values=values)
-            # tag by efficiency
-            eff = r['eff']
-            if eff < 30:
-                self.tree.item(item, tags=('bad',))
-            elif eff < 70:
-                self.tree.item(item, tags=('warn',))
-            else:
-                self.tree.item(item, tags=('ok',))
-        # tag styles
-        self.tree.tag_configure('bad', background='#4c1f1f')
-        self.tree.tag_configure('warn', background='#4c3a1f')
-        self.tree.tag_configure('ok', background='#113322')
+    def on_cancel(self):
+        if self._cancel is not None:
+            self._cancel.set()
+
+    def _set_running(self, running):
+        self.analyze_btn.configure(state='disabled' if running else 'normal')
+        self.cancel_btn.configure(state='normal' if running else 'disabled')
+        self.progress['value'] = 0
+
+    def _finish(self, status):
+        self._queue = self._cancel = None
+        self._set_running(False)
+        self.status_lbl.configure(text=status)
+
+    def _poll(self):
+        if self._queue is None:
+            return
+        try:
+            while True:
+                msg = self._queue.get_nowait()
+                kind = msg[0]
+                if kind == 'progress':
+                    self.progress['value'] = msg[1] * 100
+                    self.status_lbl.configure(text=f'Analisando... {msg[2]} tabelas')
+                elif kind == 'done':
+                    self.model = msg[1]
+                    self._show_model(self.model)
+                    return
+                elif kind == 'cancelled':
+                    self._finish('Análise cancelada.')
+                    return
+                elif kind == 'error':
+                    self._finish('Erro na análise.')
+                    messagebox.showerror('Erro', str(msg[1]))
+                    return
+        except queue.Empty:
+            pass
+        self.root.after(POLL_MS, self._poll)
+
+    def _show_model(self, model):
+        rows, recs = model.rows, model.recs
 
         # populate recommendations
         self.rec_txt.configure(state='normal')
@@ -317,31 +1352,22 @@ class AnalyzerUI:
         if not recs:
             self.rec_txt.insert('end', 'Nenhuma recomendação gerada.')
         else:
-            for msg in recs:
-                self.rec_txt.insert('end', msg + '\n')
+            self.rec_txt.insert('end', '\n'.join(recs) + '\n')
         self.rec_txt.configure(state='disabled')
 
+        self.table.set_rows(rows)
+        self._finish(f'{len(rows)} tabelas analisadas.')
+
     def on_row_double(self, event):
-        sel = self.tree.selection()
-        if not sel:
+        row = self.table.selected_row()
+        if row is None or self.model is None:
             return
-        vals = self.tree.item(sel[0], 'values')
-        table = vals[0]
-        # show details
-        raw = self.input_txt.get('1.0', 'end')
-        an = parse_analyze_blocks(raw)
-        vac = parse_vacuum_blocks(raw)
-        details = ''
-        if table in vac:
-            details += f'-- VACUUM data for {table}:\n'
-            for k, v in vac[table].items():
-                details += f'{k}: {v}\n'
-        if table in an:
-            details += f'\n-- ANALYZE data for {table}:\n'
-            for k, v in an[table].items():
-                details += f'{k}: {v}\n'
-        if not details:
-            details = 'Sem detalhes estruturados para esta tabela.'
+        table = row['table']
+        # the rows on screen came from self.model (it only changes together with them, in _poll),
+        # so the details always match the row; edited text is re-parsed by the worker, not here
+        if self.input_txt.edit_modified() and self._queue is None and self.input_txt.get('1.0', 'end').strip():
+            self.on_analyze()
+        details = self.model.details(table)
         # modal
         dlg = tk.Toplevel(self.root)
         dlg.title(f'Detalhes - {table}')
@@ -351,6 +1377,4 @@ class AnalyzerUI:
         txt.configure(state='disabled')
 
 if __name__ == '__main__':
-    root = tb.Window(themename='darkly')
-    app = AnalyzerUI(root)
-    root.mainloop()
+    sys.exit(main())